@@ -0,0 +1,333 @@
+"""Офлайн-бенчмарк сборщика: полный обход локального сервера и разбор сохраненных страниц.
+
+Каждый сценарий запускается в отдельном процессе, чтобы пиковый RSS не
+накапливался между сценариями. Результаты пишутся в JSON и могут сравниваться
+с прошлым прогоном:
+
+    python bench.py --articles 200 --latency 0.02 --workers 1 4 --output before.json
+    python bench.py --articles 200 --latency 0.02 --workers 1 4 --compare before.json
+
+Разбор отдельно замеряется на записанном корпусе: каталоге с HTML-страницами
+статей или HAR-файлами из браузера. Небольшой корпус лежит в rvision_parse/fixtures,
+синтетический можно записать так:
+
+    python bench.py --record fixtures/ --articles 50
+    python bench.py --fixtures fixtures/ --workers
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from pathlib import Path
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Пиковый RSS процесса (или его завершившихся потомков) в мегабайтах"""
+    rss = resource.getrusage(who).ru_maxrss
+    # В Linux ru_maxrss в килобайтах, в macOS - в байтах
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def classify_path(path):
+    if path.startswith("/knowledge_base/item/"):
+        return "article"
+    if path.startswith("/knowledge_base/category/"):
+        return "listing"
+    if path.startswith("/images/"):
+        return "image"
+    return "other"
+
+
+def stage_stats(snapshot, stage):
+    """Среднее и p95 стадии из снимка метрик, в миллисекундах"""
+    for histogram in snapshot['histograms']:
+        if histogram['name'] == "stage_seconds" and histogram['labels'].get('stage') == stage:
+            count = histogram['count']
+            return {
+                'count': count,
+                'mean_ms': histogram['sum'] / count * 1000 if count else 0.0,
+                'p95_ms': histogram['p95'] * 1000,
+            }
+    return {'count': 0, 'mean_ms': 0.0, 'p95_ms': 0.0}
+
+
+def crawl_once(site, collector_options, output_dir):
+    """Один обход в output_dir: время, запросы по видам и время стадий"""
+    from rvision_parse.collector import KnowledgeBaseCollector
+    from rvision_parse.metrics import metrics
+
+    metrics.reset()
+    with site.lock:
+        site.request_count = 0
+        site.requests_by_path = {}
+        site.overloaded = 0
+    collector = KnowledgeBaseCollector(base_url=site.url, base_dir=output_dir, **collector_options)
+    started = time.perf_counter()
+    processed = collector.collect_all_articles()
+    elapsed = time.perf_counter() - started
+    collector.close()
+
+    requests_by_kind = {}
+    with site.lock:
+        for path, count in site.requests_by_path.items():
+            kind = classify_path(path)
+            requests_by_kind[kind] = requests_by_kind.get(kind, 0) + count
+        total_requests = site.request_count
+    articles = len(processed)
+    snapshot = metrics.snapshot()
+    return {
+        'articles': articles,
+        'seconds': elapsed,
+        'articles_per_second': articles / elapsed if elapsed else 0.0,
+        'requests': total_requests,
+        'requests_per_article': total_requests / articles if articles else 0.0,
+        'article_requests_per_article': requests_by_kind.get("article", 0) / articles if articles else 0.0,
+        'requests_by_kind': requests_by_kind,
+        'overloaded': site.overloaded,
+        'not_modified': metrics.counter_value("articles_total", result="not_modified"),
+        'stages': {
+            stage: stage_stats(snapshot, stage)
+            for stage in ("fetch", "parse", "extract", "image", "write")
+        },
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_scenario(scenario, connection):
+    """Тело дочернего процесса: поднимает сервер, делает холодный и (опционально) повторный обход"""
+    from fake_omnidesk import FakeOmnidesk
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    site_options = {
+        key: scenario[key] for key in ("articles", "images", "image_size", "latency", "paragraphs", "capacity")
+    }
+    collector_options = {
+        'workers': scenario['workers'],
+        'parse_processes': scenario['processes'],
+        'rate_limit': 0,
+        'html_backend': scenario['html_backend'],
+    }
+    output_dir = tempfile.mkdtemp(prefix="kb-bench-")
+    try:
+        with FakeOmnidesk(**site_options) as site:
+            result = {'cold': crawl_once(site, collector_options, output_dir)}
+            if scenario['warm']:
+                # Повторный обход того же каталога: статьи должны прийти как 304
+                warm = crawl_once(site, collector_options, output_dir)
+                # ru_maxrss - максимум за весь процесс, поэтому для повторного обхода
+                # показываем только то, на сколько он поднял пик холодного
+                warm['peak_rss_delta_mb'] = warm.pop('peak_rss_mb') - result['cold']['peak_rss_mb']
+                result['warm'] = warm
+        result['peak_rss_children_mb'] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+        connection.send(result)
+    except BaseException as e:
+        connection.send({'error': repr(e)})
+        raise
+    finally:
+        connection.close()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def run_isolated(scenario):
+    """Запускает сценарий в новом процессе и возвращает его результат"""
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=run_scenario, args=(scenario, sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {'error': f"процесс сценария завершился с кодом {process.exitcode}"}
+    process.join()
+    return result
+
+
+def scenario_name(scenario):
+    return (f"articles={scenario['articles']} images={scenario['images']}x{scenario['image_size']}B "
+            f"latency={scenario['latency']} capacity={scenario['capacity']} paragraphs={scenario['paragraphs']} "
+            f"workers={scenario['workers']} processes={scenario['processes']} parser={scenario['html_backend']}")
+
+
+def load_fixtures(directory):
+    """Страницы статей из каталога: *.html как есть, из *.har - ответы на /knowledge_base/item/"""
+    pages = []
+    for path in sorted(Path(directory).iterdir()):
+        if path.suffix in (".html", ".htm"):
+            pages.append((path.name, path.read_text(encoding='utf-8')))
+        elif path.suffix == ".har":
+            har = json.loads(path.read_text(encoding='utf-8'))
+            for entry in har['log']['entries']:
+                url = entry['request']['url']
+                content = entry['response'].get('content', {})
+                if "/knowledge_base/item/" in url and content.get('text') and \
+                        content.get('encoding') != "base64" and entry['response']['status'] == 200:
+                    pages.append((url, content['text']))
+    return pages
+
+
+def record_fixtures(directory, articles, paragraphs, images):
+    """Записывает синтетические страницы статей как фиксированный корпус"""
+    from fake_omnidesk import FakeOmnidesk
+
+    os.makedirs(directory, exist_ok=True)
+    with FakeOmnidesk(articles=articles, paragraphs=paragraphs, images=images) as site:
+        for i in range(1, articles + 1):
+            Path(directory, f"article-{i}.html").write_text(site.article_page(i), encoding='utf-8')
+    print(f"Записано страниц: {articles} в {directory}")
+
+
+def bench_parse(pages, backends, repeat):
+    """Время разбора одной статьи (дерево + извлечение) на корпусе для каждого парсера"""
+    from rvision_parse.parser import parse_article_html
+
+    results = {}
+    for backend in backends:
+        timings = []
+        failed = 0
+        for _ in range(repeat):
+            for name, markup in pages:
+                started = time.perf_counter()
+                record = parse_article_html(markup, name, backend)
+                timings.append(time.perf_counter() - started)
+                failed += record is None
+        timings.sort()
+        results[backend] = {
+            'pages': len(pages),
+            'runs': len(timings),
+            'failed': failed // repeat,
+            'mean_ms': sum(timings) / len(timings) * 1000,
+            'p50_ms': timings[len(timings) // 2] * 1000,
+            'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+        }
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def rss_text(run):
+    if 'peak_rss_delta_mb' in run:
+        return f"RSS +{run['peak_rss_delta_mb']:.0f}МБ к холодному"
+    return f"RSS {run['peak_rss_mb']:.0f}МБ"
+
+
+def print_crawl(name, result):
+    if 'error' in result:
+        print(f"{name}: ошибка {result['error']}")
+        return
+    for phase in ("cold", "warm"):
+        if phase not in result:
+            continue
+        run = result[phase]
+        parse_ms = run['stages']['parse']['mean_ms'] + run['stages']['extract']['mean_ms']
+        print(f"{name} [{phase}]: {run['articles']} статей за {run['seconds']:.2f}с "
+              f"({run['articles_per_second']:.1f}/с), запросов на статью {run['requests_per_article']:.2f} "
+              f"(страниц статьи {run['article_requests_per_article']:.2f}), разбор {parse_ms:.1f}мс, "
+              f"{rss_text(run)}")
+
+
+def compare(results, baseline_path):
+    """Печатает изменение времени и числа запросов относительно прошлого прогона"""
+    baseline = json.loads(Path(baseline_path).read_text(encoding='utf-8'))
+    previous = {item['name']: item for item in baseline.get('crawl', [])}
+    for item in results['crawl']:
+        before = previous.get(item['name'])
+        if not before or 'error' in item or 'error' in before:
+            continue
+        for phase in ("cold", "warm"):
+            if phase in item and phase in before:
+                now, old = item[phase], before[phase]
+                change = (now['seconds'] / old['seconds'] - 1) * 100 if old['seconds'] else 0.0
+                print(f"{item['name']} [{phase}]: время {old['seconds']:.2f}с -> {now['seconds']:.2f}с "
+                      f"({change:+.1f}%), запросов на статью {old['requests_per_article']:.2f} -> "
+                      f"{now['requests_per_article']:.2f}, {rss_text(old)} -> {rss_text(now)}")
+    for backend, now in results.get('parse', {}).items():
+        old = baseline.get('parse', {}).get(backend)
+        if old:
+            print(f"разбор {backend}: {old['mean_ms']:.2f}мс -> {now['mean_ms']:.2f}мс на статью")
+
+
+def main():
+    from rvision_parse.html_backend import available_backends, default_backend
+
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк сборщика базы знаний")
+    parser.add_argument("--articles", type=int, default=120)
+    parser.add_argument("--images", type=int, default=2, help="изображений в статье")
+    parser.add_argument("--image-size", type=int, default=0, help="размер изображения в байтах")
+    parser.add_argument("--latency", type=float, default=0.01, help="задержка ответа сервера, с")
+    parser.add_argument("--paragraphs", type=int, default=5, help="абзацев в статье")
+    parser.add_argument("--capacity", type=int, default=0,
+                        help="одновременных запросов до ответов 429, 0 - без ограничения")
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 4],
+                        help="число потоков для полного обхода; пусто - без обхода")
+    parser.add_argument("--processes", type=int, nargs="+", default=[0], help="процессов разбора HTML")
+    parser.add_argument("--parser", default=None, help="HTML-парсер для обхода")
+    parser.add_argument("--no-warm", action="store_true", help="не делать повторный обход с кэшем")
+    parser.add_argument("--fixtures", help="каталог с HTML/HAR-страницами статей для замера разбора")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов разбора корпуса")
+    parser.add_argument("--record", help="записать синтетический корпус в каталог и выйти")
+    parser.add_argument("--output", default="bench.json", help="файл с результатами в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixtures(args.record, args.articles, args.paragraphs, args.images)
+        return
+
+    results = {'environment': environment(), 'crawl': []}
+    for processes in args.processes:
+        for workers in args.workers:
+            scenario = {
+                'articles': args.articles, 'images': args.images, 'image_size': args.image_size,
+                'latency': args.latency, 'capacity': args.capacity, 'paragraphs': args.paragraphs,
+                'workers': workers,
+                'processes': processes, 'html_backend': args.parser or default_backend(),
+                'warm': not args.no_warm,
+            }
+            name = scenario_name(scenario)
+            result = run_isolated(scenario)
+            print_crawl(name, result)
+            results['crawl'].append({'name': name, 'scenario': scenario, **result})
+
+    if args.fixtures:
+        pages = load_fixtures(args.fixtures)
+        if not pages:
+            print(f"В {args.fixtures} нет страниц статей")
+        else:
+            results['parse'] = bench_parse(pages, available_backends(), args.repeat)
+            for backend, stats in results['parse'].items():
+                print(f"разбор {backend}: {stats['pages']} страниц, среднее {stats['mean_ms']:.2f}мс, "
+                      f"p95 {stats['p95_ms']:.2f}мс, не разобрано {stats['failed']}")
+
+    Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"Результаты записаны в {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Локальный сервер с синтетическими страницами в разметке omnidesk.
+
+Используется для офлайн-проверки сборщика и замера того, как пропускная
+способность зависит от числа рабочих потоков:
+
+    python fake_omnidesk.py --articles 200 --latency 0.05 --workers 1 2 4 8
+    python fake_omnidesk.py --paragraphs 400 --latency 0 --workers 8 --processes 0 2 4 8
+
+Подробный замер с пиковой памятью, запросами на статью и выводом в JSON - bench.py.
+"""
+import argparse
+import hashlib
+import logging
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SITEMAP_XMLNS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+# Минимальный валидный PNG 1x1
+PIXEL_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+class FakeOmnidesk:
+    """Синтетическая база знаний: разделы, категории с пагинацией, статьи и изображения"""
+    def __init__(self, sections=2, categories=3, articles=60, images=2,
+                 page_size=10, latency=0.0, image_size=0, paragraphs=5, capacity=0):
+        self.sections = sections
+        self.categories = categories
+        self.articles = articles
+        self.images = images
+        self.page_size = page_size
+        self.latency = latency
+        self.image_size = image_size
+        self.paragraphs = paragraphs
+        # Сколько запросов сервер выдерживает одновременно: сверх этого отвечает 429,
+        # а задержка растет с нагрузкой; 0 - без ограничения
+        self.capacity = capacity
+        self.active = 0
+        self.overloaded = 0  # ответов 429
+        self.request_count = 0
+        self.requests_by_path = {}
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def articles_in_category(self, category_id):
+        """Статьи распределяются по категориям по кругу"""
+        count = self.sections * self.categories
+        return [i for i in range(1, self.articles + 1) if (i - 1) % count == category_id - 1]
+
+    def home_page(self):
+        blocks = []
+        for section in range(1, self.sections + 1):
+            links = "".join(
+                f'<a class="knowBaze_section_elem" href="/knowledge_base/category/{category}">'
+                f'Категория {category}</a>'
+                for category in range((section - 1) * self.categories + 1, section * self.categories + 1)
+            )
+            blocks.append(
+                f'<div class="knowBaze"><a class="kb-title-link" href="/knowledge_base/section/{section}">'
+                f'Раздел {section}</a>{links}</div>'
+            )
+        return f"<html><body>{''.join(blocks)}</body></html>"
+
+    def category_page(self, category_id, offset):
+        items = self.articles_in_category(category_id)
+        page = items[offset:offset + self.page_size]
+        links = "".join(
+            f'<a class="kb-artile-list__item" href="/knowledge_base/item/{i}?sid={category_id}">Статья {i}</a>'
+            for i in page
+        )
+        more = ""
+        if offset + self.page_size < len(items):
+            more = (
+                f'<input type="hidden" name="offset_knowledge" value="{offset + self.page_size}">'
+                '<a class="btn btn--gray" onclick="showMoreKnowledge(); return false;">Показать еще</a>'
+            )
+        return f"<html><body>{links}{more}</body></html>"
+
+    def article_page(self, article_id):
+        category = (article_id - 1) % (self.sections * self.categories) + 1
+        section = (category - 1) // self.categories + 1
+        images = "".join(
+            f'<p>Шаг {n}</p><img src="{self.url}images/{article_id}-{n}.png">'
+            for n in range(1, self.images + 1)
+        )
+        paragraphs = "".join(
+            f"<p>Абзац {n} статьи {article_id}: " + "текст " * 40 + "</p>" for n in range(self.paragraphs)
+        )
+        return (
+            "<html><body>"
+            '<ul class="breadcrumbs">'
+            '<li class="breadcrumbs__item">База знаний</li>'
+            f'<li class="breadcrumbs__item">Раздел {section}</li>'
+            f'<li class="breadcrumbs__item">Категория {category}</li>'
+            "</ul>"
+            f'<h1 class="kb-article-title">Статья {article_id}</h1>'
+            '<div class="kb-article-content clearfix">'
+            f'<div class="problem"><p>Проблема статьи {article_id}</p></div>'
+            f'<div class="solution">{images}<ul><li>Пункт 1</li><li>Пункт 2</li></ul></div>'
+            f"{paragraphs}"
+            "</div></body></html>"
+        )
+
+    def sitemap(self):
+        urls = "".join(
+            f"<url><loc>{self.url}knowledge_base/item/{i}</loc></url>" for i in range(1, self.articles + 1)
+        )
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{SITEMAP_XMLNS}">{urls}</urlset>'
+
+    def image_body(self, name):
+        if self.image_size > len(PIXEL_PNG):
+            # Хвост после IEND делает файлы уникальными и нужного размера
+            return PIXEL_PNG + name.encode() + b"\0" * (self.image_size - len(PIXEL_PNG) - len(name))
+        return PIXEL_PNG
+
+    def route(self, path, query):
+        """Возвращает (статус, content-type, тело) для пути"""
+        parts = [part for part in path.split("/") if part]
+        if not parts:
+            return 200, "text/html; charset=utf-8", self.home_page().encode()
+        if parts[:2] == ["knowledge_base", "category"] and len(parts) == 3:
+            offset = int(query.get("offset", ["0"])[0])
+            return 200, "text/html; charset=utf-8", self.category_page(int(parts[2]), offset).encode()
+        if parts[:2] == ["knowledge_base", "item"] and len(parts) == 3:
+            article_id = int(parts[2])
+            if 1 <= article_id <= self.articles:
+                return 200, "text/html; charset=utf-8", self.article_page(article_id).encode()
+        if parts == ["sitemap.xml"]:
+            return 200, "application/xml", self.sitemap().encode()
+        if parts[0] == "images" and len(parts) == 2:
+            return 200, "image/png", self.image_body(parts[1])
+        return 404, "text/plain", b"not found"
+
+    def make_handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Заголовки и тело пишутся отдельно: без этого keep-alive упирается в delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_HEAD(self):
+                self.do_GET(head=True)
+
+            def do_GET(self, head=False):
+                split = urlsplit(self.path)
+                with site.lock:
+                    site.request_count += 1
+                    site.requests_by_path[split.path] = site.requests_by_path.get(split.path, 0) + 1
+                    site.active += 1
+                    active = site.active
+                    overloaded = site.capacity and active > site.capacity
+                    site.overloaded += bool(overloaded)
+                try:
+                    if overloaded:
+                        self.send_response(429)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    if site.latency:
+                        load = active / site.capacity if site.capacity else 1
+                        time.sleep(site.latency * max(1, load))
+                    self.respond(split, head)
+                finally:
+                    with site.lock:
+                        site.active -= 1
+
+            def respond(self, split, head):
+                status, content_type, body = site.route(split.path, parse_qs(split.query))
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if status == 200 and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                if not head:
+                    self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def measure(workers, site, rate_limit=0, processes=0):
+    """Прогоняет полный сбор с заданным числом потоков и процессов разбора, возвращает число статей и время"""
+    from rvision_parse.collector import KnowledgeBaseCollector
+
+    output_dir = tempfile.mkdtemp(prefix="kb-bench-")
+    try:
+        collector = KnowledgeBaseCollector(base_url=site.url, workers=workers, rate_limit=rate_limit,
+                                           parse_processes=processes, base_dir=output_dir)
+        started = time.perf_counter()
+        processed = collector.collect_all_articles()
+        elapsed = time.perf_counter() - started
+        collector.close()
+        return len(processed), elapsed
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер пропускной способности сборщика на локальном сервере")
+    parser.add_argument("--articles", type=int, default=120)
+    parser.add_argument("--images", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа сервера, с")
+    parser.add_argument("--rate-limit", type=float, default=0, help="запросов в секунду на хост, 0 - без лимита")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--processes", type=int, nargs="+", default=[0],
+                        help="процессов разбора HTML, 0 - разбор в потоках загрузки")
+    parser.add_argument("--paragraphs", type=int, default=5, help="абзацев в статье (нагрузка на разбор)")
+    parser.add_argument("--capacity", type=int, default=0,
+                        help="одновременных запросов до ответов 429, 0 - без ограничения")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    with FakeOmnidesk(articles=args.articles, images=args.images, latency=args.latency,
+                      paragraphs=args.paragraphs, capacity=args.capacity) as site:
+        for processes in args.processes:
+            for workers in args.workers:
+                overloaded = site.overloaded
+                count, elapsed = measure(workers, site, args.rate_limit, processes)
+                print(f"workers={workers:<3} processes={processes:<3} articles={count:<5} time={elapsed:6.2f}s "
+                      f"throughput={count / elapsed:7.1f} articles/s 429={site.overloaded - overloaded}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Сбор базы знаний R-Vision (Omnidesk) в дерево текстовых файлов.
+
+Импорт пакета ничего не загружает и не настраивает: requests, bs4 и модули
+сборщика подгружаются при первом обращении к ним, а .env и логирование
+настраивает только командная строка. Встраивание в свой процесс:
+
+    from rvision_parse import crawl, CrawlConfig
+
+    for article in crawl(CrawlConfig(articles=["339231"], output_dir="/srv/kb")):
+        print(article['id'], article['path'])
+
+Командная строка: python -m rvision_parse --help
+"""
+from importlib import import_module
+
+# Имя -> модуль пакета, из которого оно загружается при первом обращении
+EXPORTS = {
+    'crawl': 'api',
+    'CrawlConfig': 'api',
+    'KnowledgeBaseCollector': 'collector',
+    'KnowledgeBaseParser': 'parser',
+    'ArticleRecord': 'parser',
+    'parse_article_html': 'parser',
+    'apply_changeset': 'changeset',
+    'RefreshService': 'refresh',
+}
+
+__all__ = list(EXPORTS)
+
+
+def __getattr__(name):
+    module = EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
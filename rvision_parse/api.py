@@ -0,0 +1,105 @@
+"""Обход как итератор статей для встраивания сборщика в другие процессы.
+
+Модули сборщика импортируются при первом запуске обхода, поэтому импорт
+crawl и CrawlConfig почти ничего не стоит.
+"""
+import queue
+import threading
+
+# Сколько записей может ждать потребителя, прежде чем обход приостановится
+RESULTS_QUEUE_SIZE = 64
+
+
+class CrawlConfig:
+    """Параметры обхода; незаданные берутся из переменных окружения, как у сборщика.
+
+    articles - ID или URL статей: обновить только их, без обхода разделов.
+    Прочие настройки (HTTP_*, EXPORT_PATH, CHANGESET_DIR, IMAGE_* и т. д.) читаются
+    из окружения.
+    """
+    def __init__(self, base_url=None, session_id=None, output_dir=None, workers=None, rate_limit=None,
+                 html_backend=None, discovery=None, id_range=None, parse_processes=None, articles=None):
+        self.base_url = base_url
+        self.session_id = session_id
+        self.output_dir = output_dir
+        self.workers = workers
+        self.rate_limit = rate_limit
+        self.html_backend = html_backend
+        self.discovery = discovery
+        # Диапазон ID для discovery=ids: строка "1-400000" или пара чисел
+        self.id_range = id_range
+        self.parse_processes = parse_processes
+        self.articles = list(articles) if articles else []
+
+    def create_collector(self):
+        from .collector import KnowledgeBaseCollector
+        from .discovery import parse_id_range
+
+        id_range = parse_id_range(self.id_range) if isinstance(self.id_range, str) else self.id_range
+        return KnowledgeBaseCollector(
+            base_url=self.base_url,
+            workers=self.workers,
+            rate_limit=self.rate_limit,
+            html_backend=self.html_backend,
+            discovery=self.discovery,
+            id_range=id_range,
+            parse_processes=self.parse_processes,
+            session_id=self.session_id,
+            base_dir=self.output_dir,
+        )
+
+
+def crawl(config=None):
+    """Запускает обход и выдает записи сохраненных (новых и измененных) статей.
+
+    Запись - словарь структурированного экспорта (url, id, title, content, images и т. д.)
+    с путем файла статьи в path. Неизменившиеся статьи не выдаются. Обход идет в
+    фоновом потоке; если перестать читать итератор (break или close()), обход
+    останавливается и при следующем запуске продолжится с контрольной точки; статьи,
+    дописанные уже после остановки, не выдаются, но попадают в дерево и changeset.
+    config - CrawlConfig, словарь его параметров или None.
+    """
+    if config is None:
+        config = CrawlConfig()
+    elif isinstance(config, dict):
+        config = CrawlConfig(**config)
+    collector = config.create_collector()
+    results = queue.Queue(RESULTS_QUEUE_SIZE)
+    finished = object()
+    errors = []
+
+    def put(item):
+        # Ожидание места в очереди прерывается остановкой обхода
+        while not collector.stop_event.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def run():
+        try:
+            if config.articles:
+                collector.collect_articles(config.articles)
+            else:
+                collector.collect_all_articles()
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            put(finished)
+
+    collector.parser.listeners.append(put)
+    thread = threading.Thread(target=run, name="kb-crawl", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = results.get()
+            if item is finished:
+                break
+            yield item
+    finally:
+        collector.stop()
+        thread.join()
+        collector.close()
+    if errors:
+        raise errors[0]
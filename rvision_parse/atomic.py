@@ -0,0 +1,41 @@
+import os
+import tempfile
+
+
+def current_umask():
+    # umask можно только заменить, поэтому ставим прежнее значение обратно
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
+
+
+# mkstemp и mkdtemp создают файлы 0600 и каталоги 0700; после rename они должны
+# получить права, как у созданных обычным open или makedirs
+UMASK = current_umask()
+
+
+def apply_default_mode(path, directory=False):
+    """Выставляет временному файлу или каталогу права по умолчанию с учетом umask"""
+    os.chmod(path, (0o777 if directory else 0o666) & ~UMASK)
+
+
+def atomic_write(path, data, encoding=None, fsync=False):
+    """Записывает файл через временный файл и rename, чтобы не оставлять недописанных файлов"""
+    path = os.fspath(path)
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        mode = 'w' if isinstance(data, str) else 'wb'
+        with os.fdopen(fd, mode, encoding=encoding if mode == 'w' else None) as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        apply_default_mode(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,227 @@
+"""Changeset обхода: только новые, измененные и удаленные статьи и изображения.
+
+При заданном CHANGESET_DIR сборщик ведет журнал изменений дерева в манифесте, а
+в конце обхода выпускает changeset-<run_id> (каталог или .tar.gz при
+CHANGESET_FORMAT=tar) с файлами и operations.json:
+
+    {"version": 1, "run_id": 12, "base_run_id": 11, "operations": [
+        {"op": "add", "kind": "article", "path": "База/Раздел/Статья.txt", "sha256": "..."},
+        {"op": "delete", "kind": "article", "path": "База/Раздел/Старая.txt", "article_id": "42"}]}
+
+Удаленные статьи становятся операциями delete (tombstone). Применить changeset на
+другом узле:
+
+    python -m rvision_parse apply changesets/changeset-000012.tar.gz /srv/knowledge_base
+"""
+import os
+import io
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tarfile
+import tempfile
+
+from .atomic import atomic_write, apply_default_mode
+
+CHANGESET_VERSION = 1
+OPERATIONS_FILE = "operations.json"
+STATE_FILE = ".changeset_state.json"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def safe_path(root, relative):
+    """Путь внутри root; пути с выходом за пределы дерева отклоняются"""
+    if os.path.isabs(relative) or ".." in relative.replace("\\", "/").split("/"):
+        raise ValueError(f"Недопустимый путь в changeset: {relative}")
+    return os.path.join(root, relative)
+
+
+def remove_file(root, relative):
+    """Удаляет файл и опустевшие каталоги над ним, не выходя за root"""
+    path = safe_path(root, relative)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return
+    directory = os.path.dirname(path)
+    root = os.path.abspath(root)
+    while os.path.abspath(directory) != root:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+
+
+def thumbnail_path(digest):
+    return f"images/thumbs/{digest}.webp"
+
+
+def collapse(changes, base_dir):
+    """Сводит журнал обхода к одной операции на путь.
+
+    Файл, добавленный и удаленный в одном обходе, в changeset не попадает.
+    Миниатюры новых изображений добавляются вместе с ними.
+    """
+    operations = {}
+    for change in changes:
+        if change['op'] == "release":
+            continue
+        expanded = [change]
+        if change['kind'] == "image" and change['op'] == "add" and change['digest']:
+            thumb = thumbnail_path(change['digest'])
+            if os.path.exists(os.path.join(base_dir, thumb)):
+                expanded.append(dict(change, kind="thumbnail", path=thumb))
+        for item in expanded:
+            previous = operations.get(item['path'])
+            op = item['op']
+            if previous and previous['op'] == "add" and op == "modify":
+                op = "add"
+            if previous and previous['op'] == "add" and op == "delete":
+                del operations[item['path']]
+                continue
+            # Порядок операций - порядок последнего изменения пути
+            operations.pop(item['path'], None)
+            operation = {'op': op, 'kind': item['kind'], 'path': item['path']}
+            if item['article_id']:
+                operation['article_id'] = item['article_id']
+            operations[item['path']] = operation
+    return list(operations.values())
+
+
+def write_changeset(manifest, base_dir, output_dir, run_id, changeset_format=None):
+    """Выпускает changeset обхода run_id и возвращает его путь.
+
+    Changeset выпускается и без изменений, чтобы цепочка base_run_id не прерывалась.
+    """
+    changeset_format = changeset_format or os.getenv('CHANGESET_FORMAT', 'dir')
+    operations = collapse(manifest.iter_changes(run_id), base_dir)
+    # Файлы, исчезнувшие после записи в журнал, в changeset не попадают
+    operations = [
+        operation for operation in operations
+        if operation['op'] == "delete" or os.path.exists(os.path.join(base_dir, operation['path']))
+    ]
+    for operation in operations:
+        if operation['op'] != "delete":
+            operation['sha256'] = file_sha256(os.path.join(base_dir, operation['path']))
+
+    document = {
+        'version': CHANGESET_VERSION,
+        'run_id': run_id,
+        'base_run_id': manifest.previous_run(run_id),
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        'operations': operations,
+    }
+    body = json.dumps(document, ensure_ascii=False, indent=2).encode('utf-8')
+    os.makedirs(output_dir, exist_ok=True)
+    name = f"changeset-{run_id:06d}"
+
+    if changeset_format == "tar":
+        path = os.path.join(output_dir, f"{name}.tar.gz")
+        fd, temp_path = tempfile.mkstemp(dir=output_dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, 'wb') as f, tarfile.open(fileobj=f, mode="w:gz") as tar:
+                info = tarfile.TarInfo(OPERATIONS_FILE)
+                info.size = len(body)
+                info.mtime = int(time.time())
+                tar.addfile(info, io.BytesIO(body))
+                for operation in operations:
+                    if operation['op'] != "delete":
+                        tar.add(os.path.join(base_dir, operation['path']), f"files/{operation['path']}")
+            apply_default_mode(temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    elif changeset_format == "dir":
+        path = os.path.join(output_dir, name)
+        temp_path = tempfile.mkdtemp(dir=output_dir, prefix=".tmp-")
+        try:
+            for operation in operations:
+                if operation['op'] != "delete":
+                    target = os.path.join(temp_path, "files", operation['path'])
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.copy2(os.path.join(base_dir, operation['path']), target)
+            with open(os.path.join(temp_path, OPERATIONS_FILE), 'wb') as f:
+                f.write(body)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            apply_default_mode(temp_path, directory=True)
+            os.rename(temp_path, path)
+        except BaseException:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+    else:
+        raise ValueError(f"Неизвестный формат changeset: {changeset_format}")
+
+    counts = {}
+    for operation in operations:
+        counts[operation['op']] = counts.get(operation['op'], 0) + 1
+    summary = ", ".join(f"{op} {count}" for op, count in sorted(counts.items())) or "изменений нет"
+    logging.info(f"Changeset {path}: {summary}")
+    return path
+
+
+class ChangesetReader:
+    """Чтение operations.json и файлов из каталога или tar.gz"""
+    def __init__(self, path):
+        self.path = path
+        self.tar = tarfile.open(path, "r:*") if os.path.isfile(path) else None
+
+    def read(self, name):
+        if self.tar is not None:
+            member = self.tar.extractfile(name)
+            if member is None:
+                raise FileNotFoundError(name)
+            return member.read()
+        with open(os.path.join(self.path, name), 'rb') as f:
+            return f.read()
+
+    def close(self):
+        if self.tar is not None:
+            self.tar.close()
+
+
+def apply_changeset(path, target, force=False):
+    """Применяет changeset к дереву target; проверяет, что он идет следом за прошлым"""
+    reader = ChangesetReader(path)
+    try:
+        document = json.loads(reader.read(OPERATIONS_FILE))
+        if document.get('version') != CHANGESET_VERSION:
+            raise ValueError(f"Неподдерживаемая версия changeset: {document.get('version')}")
+        state_path = os.path.join(target, STATE_FILE)
+        state = {}
+        if os.path.exists(state_path):
+            with open(state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        if not force and state.get('run_id') != document['base_run_id']:
+            raise RuntimeError(
+                f"Changeset {document['run_id']} собран относительно обхода {document['base_run_id']}, "
+                f"а в {target} применен {state.get('run_id')}; используйте --force после полной синхронизации"
+            )
+
+        for operation in document['operations']:
+            if operation['op'] == "delete":
+                remove_file(target, operation['path'])
+                continue
+            data = reader.read(f"files/{operation['path']}")
+            if hashlib.sha256(data).hexdigest() != operation['sha256']:
+                raise ValueError(f"Контрольная сумма {operation['path']} не совпадает")
+            destination = safe_path(target, operation['path'])
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            atomic_write(destination, data)
+
+        atomic_write(state_path, json.dumps({'run_id': document['run_id']}), encoding='utf-8')
+        return document
+    finally:
+        reader.close()
+
@@ -0,0 +1,86 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from .atomic import atomic_write
+
+
+class CrawlCheckpoint:
+    """Фронтир обхода: разделы, найденные в них статьи и уже пройденные разделы.
+
+    Завершенность отдельных статей хранится в манифесте, здесь - только то,
+    что нужно, чтобы продолжить обход без повторного обхода категорий.
+    """
+    def __init__(self, path, interval=None):
+        self.path = path
+        self.interval = interval if interval is not None else float(os.getenv('CHECKPOINT_INTERVAL', '30'))
+        self.lock = threading.Lock()
+        self.last_saved = 0.0
+        self.run_id = None
+        self.sections = []
+        self.section_articles = {}  # раздел -> список статей; есть только у полностью пройденных
+
+    def load(self, run_id):
+        """Загружает сохраненный фронтир, если он относится к тому же обходу"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logging.warning(f"Не удалось прочитать контрольную точку {self.path}: {e}")
+            return False
+        if state.get('run_id') != run_id:
+            return False
+        with self.lock:
+            self.run_id = run_id
+            self.sections = state.get('sections', [])
+            self.section_articles = state.get('section_articles', {})
+        return True
+
+    def start(self, run_id, sections):
+        with self.lock:
+            self.run_id = run_id
+            self.sections = list(sections)
+            self.section_articles = {}
+        self.save()
+
+    def is_section_done(self, section_url):
+        with self.lock:
+            return section_url in self.section_articles
+
+    def articles_for(self, section_url):
+        with self.lock:
+            return list(self.section_articles.get(section_url, []))
+
+    def complete_section(self, section_url, article_urls):
+        """Запоминает полный список статей раздела"""
+        with self.lock:
+            self.section_articles[section_url] = list(article_urls)
+        self.maybe_save()
+
+    def maybe_save(self):
+        if time.monotonic() - self.last_saved >= self.interval:
+            self.save()
+
+    def save(self):
+        with self.lock:
+            state = {
+                'run_id': self.run_id,
+                'saved_at': time.time(),
+                'sections': self.sections,
+                'section_articles': self.section_articles,
+            }
+            self.last_saved = time.monotonic()
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            atomic_write(self.path, json.dumps(state, ensure_ascii=False), encoding='utf-8', fsync=True)
+
+    def remove(self):
+        """Удаляет контрольную точку после успешного завершения обхода"""
+        with self.lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
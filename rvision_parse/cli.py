@@ -0,0 +1,112 @@
+"""Командная строка сборщика: python -m rvision_parse или rvision-parse после установки.
+
+    rvision-parse                          полный обход (как python parse_all.py)
+    rvision-parse crawl --workers 8 --discovery sitemap
+    rvision-parse article 339231 339232    обновить только указанные статьи
+    rvision-parse refresh --socket PATH    срочные обновления статей по запросам (см. refresh.py)
+    rvision-parse apply CHANGESET TARGET   применить changeset к копии дерева
+"""
+import os
+import sys
+import logging
+import argparse
+
+
+def configure():
+    """Загружает .env и настраивает логирование; при импорте пакета это не делается"""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('parser.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+
+def add_common_options(parser):
+    parser.add_argument("--output", dest="output_dir", help="каталог дерева статей (OUTPUT_DIR)")
+    parser.add_argument("--base-url", help="адрес портала (PORTAL_URL)")
+    parser.add_argument("--workers", type=int, help="потоков загрузки (WORKERS)")
+    parser.add_argument("--rate-limit", type=float, help="запросов в секунду на хост (RATE_LIMIT)")
+    parser.add_argument("--html-parser", dest="html_backend", help="lxml или html.parser (HTML_PARSER)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="rvision-parse", description="Сбор базы знаний R-Vision")
+    commands = parser.add_subparsers(dest="command")
+
+    crawl = commands.add_parser("crawl", help="полный обход портала (по умолчанию)")
+    add_common_options(crawl)
+    crawl.add_argument("--discovery", choices=["categories", "sitemap", "ids"],
+                       help="источник списка статей (DISCOVERY)")
+    crawl.add_argument("--id-range", help="диапазон ID для --discovery ids, например 1-400000 (ID_RANGE)")
+    crawl.add_argument("--parse-processes", type=int, help="процессов разбора HTML (PARSE_PROCESSES)")
+
+    article = commands.add_parser("article", help="обновить только указанные статьи")
+    add_common_options(article)
+    article.add_argument("articles", nargs="+", metavar="ID|URL")
+
+    refresh = commands.add_parser("refresh", help="обновлять статьи по запросам из очереди")
+    add_common_options(refresh)
+    refresh.add_argument("--stdin", action="store_true",
+                         help="читать запросы из stdin (по умолчанию, если нет других источников)")
+    refresh.add_argument("--watch", metavar="FILE", help="следить за дозаписью запросов в файл (REFRESH_WATCH)")
+    refresh.add_argument("--socket", metavar="PATH|PORT",
+                         help="Unix-сокет или порт на 127.0.0.1 для запросов (REFRESH_SOCKET)")
+    refresh.add_argument("--crawl-interval", type=float,
+                         help="пауза между фоновыми полными обходами, с; 0 - без них (CRAWL_INTERVAL)")
+    refresh.add_argument("--refresh-workers", type=int, help="потоков срочных обновлений (REFRESH_WORKERS)")
+
+    apply = commands.add_parser("apply", help="применить changeset к дереву")
+    apply.add_argument("changeset")
+    apply.add_argument("target")
+    apply.add_argument("--force", action="store_true", help="не проверять порядок changeset")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == "apply":
+        from .changeset import apply_changeset
+
+        document = apply_changeset(args.changeset, args.target, args.force)
+        print(f"Применен changeset {document['run_id']}: операций {len(document['operations'])}")
+        return 0
+
+    from .api import CrawlConfig, crawl
+
+    configure()
+    options = {
+        name: getattr(args, name, None)
+        for name in ("output_dir", "base_url", "workers", "rate_limit", "html_backend",
+                     "discovery", "id_range", "parse_processes", "articles")
+    }
+    if args.command == "refresh":
+        return refresh(args, CrawlConfig(**options))
+    saved = sum(1 for _ in crawl(CrawlConfig(**options)))
+    logging.info(f"Сохранено новых и измененных статей: {saved}")
+    return 0
+
+
+def refresh(args, config):
+    from .refresh import RefreshService
+
+    watch = args.watch or os.getenv('REFRESH_WATCH')
+    socket = args.socket or os.getenv('REFRESH_SOCKET')
+    stdin = sys.stdin if args.stdin or not (watch or socket) else None
+    collector = config.create_collector()
+    service = RefreshService(collector, args.refresh_workers, args.crawl_interval)
+    try:
+        service.start(stdin, watch, socket)
+        service.wait()
+    except KeyboardInterrupt:
+        logging.info("Остановка по запросу; прерванный полный обход продолжится при следующем запуске")
+    finally:
+        service.stop()
+        collector.close()
+    return 0
@@ -0,0 +1,731 @@
+import os
+import requests
+import logging
+import queue
+import threading
+import multiprocessing
+from functools import partial
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+from bs4 import Tag
+from .parser import KnowledgeBaseParser, ArticleRecord, NOT_MODIFIED, parse_article_html
+from .manifest import article_id
+from .checkpoint import CrawlCheckpoint
+from .discovery import (
+    ArticleFrontier, ProbedArticles, article_url, iter_sitemap_articles, iter_probed_articles,
+    id_range_sources, parse_id_range,
+)
+from .export import open_exporter
+from .changeset import write_changeset, remove_file
+from .metrics import metrics, MetricsReporter, make_profiler
+from .html_backend import make_soup, default_backend, HOME_NODES, LISTING_NODES
+from .throttle import HostRateLimiter, HostConcurrencyLimiter
+from .http_client import HttpClient
+from urllib.parse import urljoin, urlsplit, parse_qs
+
+class KnowledgeBaseCollector:
+    def __init__(self, base_url=None, workers=None, rate_limit=None, html_backend=None,
+                 discovery=None, id_range=None, parse_processes=None, session_id=None, base_dir=None):
+        self.base_url = base_url or os.getenv('PORTAL_URL', "https://r-vision.omnidesk.ru/")
+        # Создаем правильный объект для cookies
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.cookies.set('PHPSESSID', session_id or os.getenv('PHPSESSID'))
+        self.article_links = []
+        # Количество рабочих потоков и лимит запросов в секунду на один хост
+        self.workers = workers or int(os.getenv('WORKERS', '1'))
+        pool_size = max(10, self.workers * 2)
+        # При нескольких потоках число одновременных запросов подбирается по задержке и ошибкам
+        # портала (ADAPTIVE_CONCURRENCY=0 отключает), а фиксированный RATE_LIMIT остается
+        # необязательным потолком
+        self.concurrency = None
+        if self.workers > 1 and os.getenv('ADAPTIVE_CONCURRENCY', '1') == '1':
+            self.concurrency = HostConcurrencyLimiter(
+                initial=self.workers,
+                max_limit=int(os.getenv('MAX_CONCURRENCY', str(pool_size))),
+            )
+        if rate_limit is None:
+            rate_limit = float(os.getenv('RATE_LIMIT', '0' if self.concurrency else '5'))
+        self.rate_limiter = HostRateLimiter(rate_limit, burst=max(self.workers, 1))
+        # Одна сессия на весь сбор: пул соединений рассчитан на все потоки
+        self.client = HttpClient(
+            cookies=self.cookies,
+            rate_limiter=self.rate_limiter,
+            pool_size=pool_size,
+            concurrency=self.concurrency,
+        )
+        self.html_backend = html_backend or default_backend()
+        self.parser = KnowledgeBaseParser(client=self.client, html_backend=self.html_backend, base_dir=base_dir)
+        self.claimed_articles = set()  # ID статей, уже взятых в работу одним из потоков
+        # Число процессов для разбора HTML; 0 - разбор в потоках загрузки
+        self.parse_processes = parse_processes if parse_processes is not None \
+            else int(os.getenv('PARSE_PROCESSES', '0'))
+        # Источник списка статей: categories (обход разделов), sitemap или ids (перебор ID)
+        self.discovery = discovery or os.getenv('DISCOVERY', 'categories')
+        self.id_range = id_range or parse_id_range(os.getenv('ID_RANGE', '1-400000'))
+        self.lock = threading.Lock()
+        # Остановка обхода из другого потока; прерванный обход продолжится с контрольной точки
+        self.stop_event = threading.Event()
+        # Срочные обновления статей (режим refresh): пока они идут, обход не берет новые статьи
+        self.urgent = threading.Condition()
+        self.urgent_count = 0
+        # Вложенность collecting(): экспорт и метрики открывает только внешний вызов
+        self.collecting_depth = 0
+        # Профилирование process_article по PROFILE=cprofile|pyinstrument
+        self.profiler = make_profiler()
+
+    @property
+    def processed_articles(self):
+        """Статьи, обработанные в текущем обходе; хранятся в манифесте и переживают перезапуск"""
+        return self.parser.get_manifest().processed
+
+    def request(self, url, **kwargs):
+        """Выполняет GET-запрос через общую HTTP-сессию"""
+        return self.client.get(url, **kwargs)
+
+    def stop(self):
+        """Просит обход остановиться: новые статьи не берутся, начатые дорабатываются"""
+        self.stop_event.set()
+        with self.urgent:
+            self.urgent.notify_all()
+
+    def close(self):
+        """Освобождает манифест, HTTP-кэш и соединения; нужно при многих обходах в одном процессе"""
+        self.parser.close()
+        self.client.close()
+
+    @contextmanager
+    def urgent_work(self):
+        """Срочная работа, ради которой обход приостанавливает выдачу новых статей"""
+        with self.urgent:
+            self.urgent_count += 1
+        try:
+            yield
+        finally:
+            with self.urgent:
+                self.urgent_count -= 1
+                self.urgent.notify_all()
+
+    def wait_for_urgent(self):
+        with self.urgent:
+            self.urgent.wait_for(lambda: not self.urgent_count or self.stop_event.is_set())
+
+    def file_exists(self, filepath):
+        """Проверяет существование файла"""
+        return os.path.exists(filepath)
+
+    def should_update_article(self, article_url, article=None):
+        """Проверяет по манифесту, нужно ли обновлять статью"""
+        try:
+            # Используем уже разобранную страницу, чтобы не загружать её повторно
+            if article is None:
+                article = self.parser.fetch_article(article_url)
+            if article is None:
+                logging.warning(f"Не удалось получить статью {article_url}")
+                return True
+
+            if not article.content_text:
+                logging.warning(f"Не удалось получить содержимое статьи {article_url}")
+                return True
+
+            if not article.title:
+                logging.warning(f"Не удалось получить заголовок статьи {article_url}")
+                return True
+
+            entry = self.parser.get_manifest().get(article_url)
+            if entry is None or not entry['output_path']:
+                logging.info(f"Статья {article_url} отсутствует в манифесте")
+                return True
+
+            if not self.file_exists(entry['output_path']):
+                logging.info(f"Файл статьи {article_url} отсутствует")
+                return True
+
+            if entry['content_hash'] != article.content_hash:
+                logging.info(f"Содержимое статьи {article_url} изменилось")
+                return True
+
+            # Все изображения статьи должны были быть успешно загружены
+            if len(entry['image_hashes']) != len(article.images) or not all(entry['image_hashes']):
+                logging.info(f"Не все изображения статьи {article_url} загружены")
+                return True
+
+            logging.info(f"Статья {article_url} не требует обновления")
+            return False
+
+        except Exception as e:
+            logging.warning(f"Ошибка при проверке статьи {article_url}: {e}")
+            return True
+
+    def claim_article(self, article_url, refresh=False):
+        """Берет статью в работу; возвращает ключ или None, если она уже обработана или в работе.
+
+        При refresh=True статья берется, даже если уже обработана в текущем обходе, и без
+        ожидания срочных обновлений - она сама из их числа.
+        """
+        if not refresh:
+            self.wait_for_urgent()
+        if self.stop_event.is_set():
+            return None
+        key = article_id(article_url)
+        with self.lock:
+            if key in self.claimed_articles:
+                logging.info(f"Статья {article_url} уже в работе")
+                return None
+            if not refresh and article_url in self.processed_articles:
+                logging.info(f"Статья {article_url} уже была обработана")
+                return None
+            self.claimed_articles.add(key)
+            metrics.set_gauge("articles_in_progress", len(self.claimed_articles))
+        return key
+
+    def release_article(self, key):
+        with self.lock:
+            self.claimed_articles.discard(key)
+            metrics.set_gauge("articles_in_progress", len(self.claimed_articles))
+
+    def finish_article(self, article_url, article):
+        """Проверяет статью по манифесту и сохраняет ее при изменениях.
+
+        article - разобранная страница (ArticlePage) или готовая запись (ArticleRecord).
+        Возвращает итог: updated, unchanged или failed.
+        """
+        if not self.should_update_article(article_url, article):
+            self.parser.remember_article(article)
+            self.processed_articles.add(article_url)
+            metrics.inc("articles_total", result="unchanged")
+            return "unchanged"
+
+        # parse_page и save_record сами записывают статью в манифест
+        if isinstance(article, ArticleRecord):
+            article_file = self.parser.save_record(article)
+        else:
+            article_file = self.parser.parse_page(article_url, article)
+        if article_file is None:
+            logging.error(f"Не удалось сохранить статью {article_url}")
+            metrics.inc("articles_total", result="failed")
+            return "failed"
+        metrics.inc("articles_total", result="updated")
+        logging.info(f"Статья {article_url} успешно обработана")
+        return "updated"
+
+    def process_article(self, article_url, refresh=False):
+        """Обрабатывает статью с проверкой на существование.
+
+        Возвращает итог (updated, unchanged, not_modified, failed) или None, если статья
+        не взята в работу. refresh=True - срочное обновление, см. claim_article.
+        """
+        if self.profiler is not None:
+            with self.profiler.profile():
+                return self.process_article_unprofiled(article_url, refresh)
+        return self.process_article_unprofiled(article_url, refresh)
+
+    def process_article_unprofiled(self, article_url, refresh=False):
+        key = self.claim_article(article_url, refresh)
+        if key is None:
+            return None
+
+        try:
+            # Загружаем и разбираем страницу один раз для проверки и сохранения
+            article = self.parser.fetch_article(article_url, conditional=True)
+            if article is NOT_MODIFIED:
+                logging.info(f"Статья {article_url} не изменилась с прошлого обхода")
+                self.processed_articles.add(article_url)
+                metrics.inc("articles_total", result="not_modified")
+                return "not_modified"
+            if article is None:
+                logging.error(f"Ошибка получения статьи {article_url}")
+                metrics.inc("articles_total", result="failed")
+                return "failed"
+            if refresh:
+                # Изображения перепроверяются на портале, а не берутся из памяти процесса
+                self.parser.forget_images(article.images)
+            return self.finish_article(article_url, article)
+
+        except Exception as e:
+            logging.error(f"Ошибка при обработке статьи {article_url}: {e}")
+            metrics.inc("articles_total", result="failed")
+            return "failed"
+        finally:
+            self.release_article(key)
+
+    def enqueue_article(self, article_url, parse_queue):
+        """Сетевая стадия конвейера: загружает HTML статьи и кладет его в очередь на разбор.
+
+        Очередь ограничена, поэтому при отставании разбора загрузка приостанавливается.
+        """
+        key = self.claim_article(article_url)
+        if key is None:
+            return
+
+        queued = False
+        try:
+            page = self.parser.fetch_article_html(article_url, conditional=True)
+            if page is NOT_MODIFIED:
+                logging.info(f"Статья {article_url} не изменилась с прошлого обхода")
+                self.processed_articles.add(article_url)
+                metrics.inc("articles_total", result="not_modified")
+                return
+            if page is None:
+                logging.error(f"Ошибка получения статьи {article_url}")
+                metrics.inc("articles_total", result="failed")
+                return
+            html, cache_entry = page
+            parse_queue.put((key, article_url, html, cache_entry))
+            metrics.set_gauge("parse_queue_depth", parse_queue.qsize())
+            queued = True
+        except Exception as e:
+            logging.error(f"Ошибка при обработке статьи {article_url}: {e}")
+            metrics.inc("articles_total", result="failed")
+        finally:
+            # Иначе статью освободит parse_worker после сохранения
+            if not queued:
+                self.release_article(key)
+
+    def parse_worker(self, parse_queue, process_pool):
+        """Стадия разбора: отдает HTML пулу процессов и сохраняет полученную запись"""
+        while True:
+            item = parse_queue.get()
+            if item is None:
+                return
+            key, article_url, html, cache_entry = item
+            metrics.set_gauge("parse_queue_depth", parse_queue.qsize())
+            try:
+                # Разбор и извлечение идут в дочернем процессе, поэтому замеряются вместе
+                with metrics.timer("parse"):
+                    record = process_pool.submit(
+                        parse_article_html, html, article_url, self.html_backend, cache_entry
+                    ).result()
+                if record is None:
+                    logging.error(f"Не найдены заголовок или содержание статьи {article_url}")
+                    metrics.inc("articles_total", result="failed")
+                elif self.profiler is not None:
+                    with self.profiler.profile():
+                        self.finish_article(article_url, record)
+                else:
+                    self.finish_article(article_url, record)
+            except Exception as e:
+                logging.error(f"Ошибка при обработке статьи {article_url}: {e}")
+                metrics.inc("articles_total", result="failed")
+            finally:
+                self.release_article(key)
+
+    def get_section_links(self):
+        """Получает все ссылки на разделы с главной страницы"""
+        try:
+            response = self.request(self.base_url)
+            if response.status_code == 200:
+                soup = make_soup(response.text, HOME_NODES, self.html_backend)
+                sections = soup.find_all("a", class_="kb-title-link")
+                links = []
+                
+                logging.info(f"Найдено {len(sections)} основных разделов")
+                
+                for section in sections:
+                    try:
+                        section_block = section.find_parent("div", class_="knowBaze")
+                        if section_block:
+                            categories = section_block.find_all("a", class_="knowBaze_section_elem")
+                            logging.debug(f"В разделе найдено {len(categories)} категорий")
+                            for category in categories:
+                                link = category.get('href')
+                                if link:
+                                    full_link = urljoin(self.base_url, link)
+                                    links.append(full_link)
+                                    logging.debug(f"Добавлена категория: {full_link}")
+                    except Exception as section_error:
+                        logging.error(f"Ошибка при обработке раздела: {section_error}")
+                        continue
+                        
+                logging.info(f"Всего найдено {len(links)} категорий")
+                return links
+            else:
+                logging.error(f"Ошибка при получении главной страницы: {response.status_code}")
+                return []
+        except requests.Timeout:
+            logging.error("Таймаут при получении главной страницы")
+            return []
+        except Exception as e:
+            logging.error(f"Критическая ошибка при получении ссылок разделов: {e}")
+            return []
+
+    def fetch_listing_page(self, page_url):
+        """Загружает страницу списка статей; возвращает (ссылки, следующий offset) или None"""
+        try:
+            logging.info(f"Получаем статьи со страницы: {page_url}")
+            response = self.request(page_url)
+            if response.status_code != 200:
+                logging.error(f"Ошибка при получении раздела {page_url}: {response.status_code}")
+                return None
+            soup = make_soup(response.text, LISTING_NODES, self.html_backend)
+            links = []
+            for article in soup.find_all("a", class_="kb-artile-list__item"):
+                link = article.get('href')
+                if link:
+                    links.append(urljoin(self.base_url, link))
+
+            # Следующая страница есть, только если видна кнопка "показать еще"
+            next_offset = None
+            try:
+                show_more = soup.find("a", class_="btn btn--gray",
+                                      onclick=lambda x: 'showMoreKnowledge' in str(x) if x else False)
+                if show_more:
+                    offset = soup.find("input", {"name": "offset_knowledge"})
+                    if offset and isinstance(offset, Tag):
+                        next_offset = int(offset.get('value', '0'))
+            except Exception as pagination_error:
+                logging.error(f"Ошибка при обработке пагинации: {pagination_error}")
+            return links, next_offset
+        except requests.Timeout:
+            logging.error(f"Таймаут при получении раздела {page_url}")
+        except Exception as e:
+            logging.error(f"Критическая ошибка при получении ссылок статей: {e}")
+        return None
+
+    def iter_article_links(self, section_url):
+        """Выдает ссылки на статьи раздела по мере их обнаружения.
+
+        После первой страницы шаг offset известен, поэтому следующие страницы
+        запрашиваются пачками по числу потоков. Повторные ссылки и уже
+        запрошенные offset пропускаются.
+        """
+        base_url = section_url.split('?')[0]
+        current_offset = int(parse_qs(urlsplit(section_url).query).get('offset', ['0'])[0])
+        seen_links = set()
+        seen_offsets = {current_offset}
+
+        page = self.fetch_listing_page(section_url)
+        if page is None:
+            return
+        links, next_offset = page
+        for link in links:
+            if link not in seen_links:
+                seen_links.add(link)
+                yield link
+
+        step = next_offset - current_offset if next_offset is not None else 0
+        batch_size = max(1, self.workers) if step > 0 else 1
+        with ThreadPoolExecutor(batch_size, thread_name_prefix="kb-list") as executor:
+            while next_offset is not None and next_offset not in seen_offsets:
+                offsets = [next_offset + i * step for i in range(batch_size)]
+                offsets = [offset for offset in offsets if offset not in seen_offsets]
+                seen_offsets.update(offsets)
+                pages = executor.map(self.fetch_listing_page, [f"{base_url}?offset={offset}" for offset in offsets])
+                next_offset = None
+                for page in pages:
+                    if page is None:
+                        break
+                    links, page_next = page
+                    new_links = [link for link in links if link not in seen_links]
+                    seen_links.update(new_links)
+                    yield from new_links
+                    # Конец списка: кнопки больше нет или страница не принесла новых статей
+                    if page_next is None or not new_links:
+                        break
+                    next_offset = page_next
+                else:
+                    continue
+                # Лишние страницы пачки за концом списка отбрасываем
+                next_offset = None
+
+        logging.info(f"Найдено {len(seen_links)} статей в разделе {section_url}")
+
+    def get_article_links(self, section_url):
+        """Получает все ссылки на статьи из раздела"""
+        return list(self.iter_article_links(section_url))
+
+    def get_checkpoint(self):
+        """Контрольная точка обхода рядом с манифестом в base_dir"""
+        return CrawlCheckpoint(os.path.join(self.parser.base_dir, ".checkpoint.json"))
+
+    def get_sources(self):
+        """Источники статей для выбранного режима поиска"""
+        if self.discovery == 'sitemap':
+            return ['sitemap']
+        if self.discovery == 'ids':
+            return id_range_sources(*self.id_range)
+        return self.get_section_links()
+
+    def iter_source_links(self, source):
+        """Ссылки на статьи из одного источника: sitemap, диапазона ID или категории"""
+        if source == 'sitemap':
+            return iter_sitemap_articles(self.client, self.base_url)
+        if source.startswith('ids:'):
+            start, end = parse_id_range(source[len('ids:'):])
+            return iter_probed_articles(self.client, self.base_url, start, end, self.workers, self.stop_event)
+        return self.iter_article_links(source)
+
+    def iter_section_articles(self, section_url, checkpoint, frontier=None):
+        """Статьи источника из контрольной точки или с сайта по мере обнаружения.
+
+        Статьи, уже попавшие во frontier из другого источника, повторно не выдаются.
+        """
+        if checkpoint.is_section_done(section_url):
+            for link in checkpoint.articles_for(section_url):
+                if frontier is None or frontier.add(link):
+                    yield link
+            return
+        links = []
+        source = self.iter_source_links(section_url)
+        for link in source:
+            # Раздел, обход которого прерван, не отмечается пройденным
+            if self.stop_event.is_set():
+                return
+            links.append(link)
+            if frontier is None or frontier.add(link):
+                yield link
+        if self.stop_event.is_set():
+            return
+        if isinstance(source, ProbedArticles):
+            # Диапазон ID пройден, если все ID проверены, даже когда статей в нем нет
+            if not source.failed and not source.interrupted:
+                checkpoint.complete_section(section_url, links)
+        # Пустой результат может означать ошибку загрузки - такой раздел обойдем заново
+        elif links:
+            checkpoint.complete_section(section_url, links)
+
+    def submit_section(self, executor, section_url, checkpoint, frontier, article_task):
+        """Ставит статьи раздела в очередь пула, не дожидаясь конца пагинации"""
+        return [
+            executor.submit(article_task, article_url)
+            for article_url in self.iter_section_articles(section_url, checkpoint, frontier)
+        ]
+
+    def start_parse_pipeline(self):
+        """Запускает пул процессов разбора и потоки, забирающие HTML из ограниченной очереди"""
+        parse_queue = queue.Queue(maxsize=self.parse_processes * 4)
+        # fork из процесса с потоками HTTP, метрик и изображений и открытыми SQLite может
+        # зависнуть в дочернем процессе; forkserver запускает их с чистого состояния
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        process_pool = ProcessPoolExecutor(self.parse_processes,
+                                           mp_context=multiprocessing.get_context(start_method))
+        threads = [
+            threading.Thread(target=self.parse_worker, args=(parse_queue, process_pool),
+                             name=f"kb-parse-{i}", daemon=True)
+            for i in range(self.parse_processes)
+        ]
+        for thread in threads:
+            thread.start()
+        logging.info(f"Разбор HTML в {self.parse_processes} процессах")
+        return parse_queue, process_pool, threads
+
+    def stop_parse_pipeline(self, pipeline):
+        """Дожидается разбора всей очереди и останавливает пул процессов"""
+        parse_queue, process_pool, threads = pipeline
+        for _ in threads:
+            parse_queue.put(None)
+        for thread in threads:
+            thread.join()
+        process_pool.shutdown()
+
+    @contextmanager
+    def collecting(self, checkpoint=None):
+        """Экспорт, метрики и профиль на время обхода; по выходе все сохраняется и закрывается.
+
+        Вложенный вызов (обход внутри режима refresh) пользуется уже открытыми.
+        """
+        with self.lock:
+            self.collecting_depth += 1
+            outer = self.collecting_depth == 1
+        if not outer:
+            try:
+                yield
+            finally:
+                if checkpoint is not None:
+                    checkpoint.save()
+                with self.lock:
+                    self.collecting_depth -= 1
+            return
+
+        # Записи статей пишутся в экспорт по мере сохранения, а не собираются в памяти
+        export_path = os.getenv('EXPORT_PATH')
+        if export_path:
+            self.parser.exporter = open_exporter(export_path, run_id=self.parser.get_manifest().open_run())
+        reporter = MetricsReporter(metrics).start()
+        try:
+            yield
+        finally:
+            if checkpoint is not None:
+                checkpoint.save()
+            with self.lock:
+                self.collecting_depth -= 1
+            self.parser.close_image_pipeline()
+            if self.parser.exporter is not None:
+                self.parser.exporter.close()
+                self.parser.exporter = None
+            reporter.stop()
+            if os.getenv('METRICS_JSON'):
+                metrics.dump_json(os.getenv('METRICS_JSON'))
+            if self.profiler is not None:
+                self.profiler.save()
+
+    def collect_all_articles(self):
+        """Собирает все статьи с сайта, продолжая прерванный обход с контрольной точки"""
+        manifest = self.parser.get_manifest()
+        run_id = manifest.begin_run()
+        checkpoint = self.get_checkpoint()
+        if checkpoint.load(run_id):
+            section_links = checkpoint.sections
+            logging.info(f"Продолжаем обход {run_id}: уже обработано статей {len(self.processed_articles)}")
+        else:
+            section_links = self.get_sources()
+            checkpoint.start(run_id, section_links)
+        logging.info(f"Начинаем сбор статей из {len(section_links)} источников "
+                     f"({self.discovery}, обход {run_id})")
+
+        frontier = ArticleFrontier()
+        # Изображения, скачанные прошлыми обходами этого процесса, проверяются заново
+        self.parser.forget_images()
+        with self.collecting(checkpoint):
+            if self.workers <= 1 and not self.parse_processes:
+                for section_url in section_links:
+                    for article_url in self.iter_section_articles(section_url, checkpoint, frontier):
+                        self.process_article(article_url)
+            else:
+                self.collect_concurrently(section_links, checkpoint, frontier)
+
+        processed = set(self.processed_articles)
+        if self.stop_event.is_set():
+            # Обход не завершен: удаление пропавших статей и changeset отложены до его продолжения
+            logging.info(f"Обход {run_id} остановлен, обработано статей: {len(processed)}")
+            return processed
+        logging.info(f"Обработка завершена. Всего обработано статей: {len(processed)}")
+        changeset_dir = os.getenv('CHANGESET_DIR')
+        if changeset_dir:
+            self.prune_deleted_articles()
+            self.prune_images()
+            write_changeset(manifest, self.parser.base_dir, changeset_dir, run_id)
+        manifest.finish_run()
+        checkpoint.remove()
+        return processed
+
+    def collect_articles(self, articles):
+        """Обновляет только указанные статьи (ID или URL) без обхода разделов.
+
+        Статьи, пропавшие с портала, не удаляются: для этого нужен полный обход. Если
+        полный обход прерван, статьи записываются в него, и changeset выпустит его
+        продолжение; иначе обновление становится отдельным коротким обходом.
+        """
+        manifest = self.parser.get_manifest()
+        resumed = manifest.open_run() is not None
+        run_id = manifest.begin_run()
+        urls = list(dict.fromkeys(article_url(self.base_url, article) for article in articles))
+        logging.info(f"Обновление статей: {len(urls)} (обход {run_id})")
+
+        with self.collecting():
+            if self.workers <= 1 or len(urls) < 2:
+                for url in urls:
+                    self.process_article(url, refresh=True)
+            else:
+                with ThreadPoolExecutor(self.workers, thread_name_prefix="kb") as executor, \
+                        ThreadPoolExecutor(self.workers, thread_name_prefix="kb-img") as image_executor:
+                    self.parser.image_executor = image_executor
+                    try:
+                        list(executor.map(partial(self.process_article, refresh=True), urls))
+                    finally:
+                        self.parser.image_executor = None
+
+        processed = {url for url in urls if url in self.processed_articles}
+        if not resumed and not self.stop_event.is_set():
+            self.finish_updates()
+        return processed
+
+    def finish_updates(self):
+        """Завершает обход из одних обновлений статей: changeset без удаления пропавших статей"""
+        manifest = self.parser.get_manifest()
+        run_id = manifest.open_run()
+        if run_id is None:
+            return
+        # Привязывает манифест к открытому обходу, если статьи записывал другой объект
+        manifest.begin_run()
+        changeset_dir = os.getenv('CHANGESET_DIR')
+        if changeset_dir:
+            self.prune_images()
+            write_changeset(manifest, self.parser.base_dir, changeset_dir, run_id)
+        manifest.finish_run()
+
+    def prune_deleted_articles(self):
+        """Удаляет статьи, которых не было в обходе и которые портал отдает как 404/410.
+
+        Статья, не найденная в списках, но доступная по ссылке (или недоступная из-за
+        ошибки сети), остается: tombstone выпускается только для точно удаленных.
+        """
+        manifest = self.parser.get_manifest()
+        stale = manifest.iter_stale()
+        if not stale:
+            return
+
+        def check(entry):
+            try:
+                return entry, self.client.head(entry['url'], allow_redirects=True).status_code
+            except Exception as e:
+                logging.warning(f"Не удалось проверить статью {entry['url']}: {e}")
+                return entry, None
+
+        with ThreadPoolExecutor(max(1, self.workers), thread_name_prefix="kb-prune") as executor:
+            for entry, status in executor.map(check, stale):
+                if status not in (404, 410):
+                    logging.info(f"Статья {entry['url']} не найдена в обходе, но доступна ({status}); оставляем")
+                    continue
+                logging.info(f"Статья {entry['url']} удалена на портале")
+                digests = manifest.delete(entry['url'])
+                # Файл остается, если на него ссылается одноименная статья той же категории
+                if entry['output_path'] and not manifest.path_in_use(entry['output_path']):
+                    path = os.path.relpath(entry['output_path'], self.parser.base_dir)
+                    remove_file(self.parser.base_dir, path)
+                    manifest.record_change("delete", "article", path, entry['article_id'])
+                for digest in digests:
+                    manifest.record_change("release", "image", None, entry['article_id'], digest)
+
+    def prune_images(self):
+        """Удаляет изображения, на которые после обхода не ссылается ни одна статья"""
+        manifest = self.parser.get_manifest()
+        released = {
+            change['digest'] for change in manifest.iter_changes(manifest.current_run())
+            if change['op'] == "release"
+        }
+        store = self.parser.get_image_store()
+        for digest in released - manifest.referenced_images():
+            for relative in store.remove(digest):
+                kind = "thumbnail" if relative.startswith("thumbs/") else "image"
+                manifest.record_change("delete", kind, f"images/{relative}", digest=digest)
+
+    def collect_concurrently(self, section_links, checkpoint, frontier):
+        """Параллельно обходит разделы, статьи и изображения пулом потоков.
+
+        При parse_processes > 0 работает как конвейер: потоки загружают HTML в
+        ограниченную очередь, а разбор и сохранение идут через пул процессов.
+        """
+        logging.info(f"Параллельный сбор в {self.workers} потоков")
+        # Изображения качаются в отдельном пуле, чтобы задачи статей не ждали сами себя
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="kb") as executor, \
+                ThreadPoolExecutor(self.workers, thread_name_prefix="kb-img") as image_executor:
+            self.parser.image_executor = image_executor
+            # С пулом процессов потоки только загружают HTML, а разбор идет в процессах
+            pipeline = self.start_parse_pipeline() if self.parse_processes else None
+            if pipeline:
+                article_task = partial(self.enqueue_article, parse_queue=pipeline[0])
+            else:
+                article_task = self.process_article
+            try:
+                # Разделы обходятся в отдельном пуле: их задачи сами ставят статьи в основной
+                with ThreadPoolExecutor(self.workers, thread_name_prefix="kb-section") as section_executor:
+                    section_futures = [
+                        section_executor.submit(self.submit_section, executor, url, checkpoint, frontier,
+                                                article_task)
+                        for url in section_links
+                    ]
+                    article_futures = []
+                    for future in section_futures:
+                        article_futures.extend(future.result())
+                wait(article_futures)
+            except BaseException:
+                # При прерывании не ждем всю очередь: отменяем то, что еще не начато
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            finally:
+                # Разбор останавливаем после загрузчиков, иначе они могут повиснуть на полной очереди
+                executor.shutdown(wait=True)
+                if pipeline:
+                    self.stop_parse_pipeline(pipeline)
+                self.parser.image_executor = None
+ 
\ No newline at end of file
@@ -0,0 +1,162 @@
+import gzip
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+from .manifest import article_id, ARTICLE_ID_RE
+
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+
+class ArticleFrontier:
+    """Очередь найденных статей без повторов по ID статьи"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = set()
+
+    def add(self, url):
+        """Возвращает True, если статья встретилась впервые"""
+        key = article_id(url)
+        with self.lock:
+            if key in self.ids:
+                return False
+            self.ids.add(key)
+            return True
+
+    def __len__(self):
+        with self.lock:
+            return len(self.ids)
+
+
+def sitemap_locations(client, base_url):
+    """Адреса sitemap из robots.txt, а если их нет - стандартный /sitemap.xml"""
+    locations = []
+    try:
+        response = client.get(urljoin(base_url, "/robots.txt"))
+        if response.status_code == 200:
+            for line in response.text.splitlines():
+                key, _, value = line.partition(":")
+                if key.strip().lower() == "sitemap" and value.strip():
+                    locations.append(value.strip())
+    except Exception as e:
+        logging.warning(f"Не удалось получить robots.txt: {e}")
+    return locations or [urljoin(base_url, "/sitemap.xml")]
+
+
+def iter_sitemap_articles(client, base_url):
+    """Выдает URL статей из sitemap, включая вложенные sitemap-индексы"""
+    pending = sitemap_locations(client, base_url)
+    visited = set()
+    while pending:
+        location = pending.pop()
+        if location in visited:
+            continue
+        visited.add(location)
+        try:
+            response = client.get(location)
+            if response.status_code != 200:
+                logging.warning(f"Sitemap {location} недоступен: {response.status_code}")
+                continue
+            body = response.content
+            if body[:2] == b"\x1f\x8b":
+                body = gzip.decompress(body)
+            root = ET.fromstring(body)
+        except Exception as e:
+            logging.error(f"Ошибка при разборе sitemap {location}: {e}")
+            continue
+
+        if root.tag == f"{SITEMAP_NS}sitemapindex":
+            pending.extend(loc.text.strip() for loc in root.iter(f"{SITEMAP_NS}loc") if loc.text)
+            continue
+        for loc in root.iter(f"{SITEMAP_NS}loc"):
+            if loc.text and ARTICLE_ID_RE.search(loc.text):
+                yield loc.text.strip()
+
+
+def article_url(base_url, value):
+    """URL статьи по ее ID или ссылке"""
+    value = str(value).strip()
+    if value.isdigit():
+        return urljoin(base_url, f"/knowledge_base/item/{value}")
+    return urljoin(base_url, value)
+
+
+class ProbedArticles:
+    """Существующие статьи диапазона ID [start, end], найденные HEAD-запросами.
+
+    После обхода failed - число ID, проверить которые не удалось (ошибка сети или
+    ответ, отличный от 200 и 404/410): без них пустой диапазон действительно пуст.
+    interrupted - проверка остановлена по stop_event и диапазон пройден не весь.
+    """
+    # Сколько проверок на поток ставится в пул наперед: остановка не ждет остаток диапазона
+    WINDOW_PER_WORKER = 4
+
+    def __init__(self, client, base_url, start, end, workers=1, stop_event=None):
+        self.client = client
+        self.base_url = base_url
+        self.start = start
+        self.end = end
+        self.workers = max(1, workers)
+        self.stop_event = stop_event or threading.Event()
+        self.lock = threading.Lock()
+        self.failed = 0
+        self.interrupted = False
+
+    def probe(self, item_id):
+        if self.stop_event.is_set():
+            self.interrupted = True
+            return None
+        url = article_url(self.base_url, item_id)
+        try:
+            response = self.client.head(url, allow_redirects=True)
+            if response.status_code == 200:
+                return url
+            if response.status_code in (404, 410):
+                return None
+            logging.warning(f"Статья {url} не проверена: HTTP {response.status_code}")
+        except Exception as e:
+            logging.warning(f"Ошибка при проверке статьи {url}: {e}")
+        with self.lock:
+            self.failed += 1
+        return None
+
+    def __iter__(self):
+        item_ids = iter(range(self.start, self.end + 1))
+        pending = deque()
+        executor = ThreadPoolExecutor(self.workers, thread_name_prefix="kb-probe")
+        try:
+            while True:
+                while len(pending) < self.workers * self.WINDOW_PER_WORKER:
+                    if self.stop_event.is_set():
+                        self.interrupted = True
+                        break
+                    item_id = next(item_ids, None)
+                    if item_id is None:
+                        break
+                    pending.append(executor.submit(self.probe, item_id))
+                if not pending:
+                    return
+                url = pending.popleft().result()
+                if url:
+                    yield url
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+
+def iter_probed_articles(client, base_url, start, end, workers=1, stop_event=None):
+    """Проверяет HEAD-запросами ID статей из диапазона [start, end] и выдает существующие"""
+    return ProbedArticles(client, base_url, start, end, workers, stop_event)
+
+
+def id_range_sources(start, end, chunk=1000):
+    """Делит диапазон ID на источники вида ids:<from>-<to> для контрольной точки"""
+    return [f"ids:{first}-{min(first + chunk - 1, end)}" for first in range(start, end + 1, chunk)]
+
+
+def parse_id_range(value):
+    """Разбирает строку диапазона вида 1000-400000"""
+    first, _, last = value.partition("-")
+    return int(first), int(last)
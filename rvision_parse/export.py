@@ -0,0 +1,133 @@
+import os
+import gzip
+import json
+import time
+import itertools
+import threading
+
+EXPORT_FIELDS = [
+    'url', 'id', 'title', 'base', 'section', 'category',
+    'problem', 'solution', 'content', 'images',
+]
+
+
+class JsonlExporter:
+    """Потоковая запись статей в один JSONL-файл (опционально gzip или zstd) в режиме дозаписи"""
+    def __init__(self, path, compression=None):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if compression == 'gzip':
+            self.file = gzip.open(path, 'at', encoding='utf-8')
+        elif compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError("Для экспорта в zstd установите пакет zstandard")
+            self.file = zstandard.open(path, 'at', encoding='utf-8')
+        else:
+            self.file = open(path, 'a', encoding='utf-8')
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + "\n")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def run_export_path(path, run_id=None):
+    """Основа имени файлов экспорта одного обхода: export.parquet -> export-000012.parquet.
+
+    Без номера обхода (режим refresh открывает экспорт до начала обхода) к имени
+    добавляется время открытия.
+    """
+    stem, extension = os.path.splitext(path)
+    suffix = f"{run_id:06d}" if run_id is not None else time.strftime("%Y%m%d-%H%M%S")
+    return f"{stem}-{suffix}{extension}"
+
+
+def open_part(path):
+    """Открывает первый несуществующий файл path-1, path-2, ... и возвращает (путь, файл)"""
+    stem, extension = os.path.splitext(path)
+    for part in itertools.count(1):
+        part_path = f"{stem}-{part}{extension}"
+        try:
+            return part_path, open(part_path, 'xb')
+        except FileExistsError:
+            continue
+
+
+class ParquetExporter:
+    """Запись статей в Parquet группами строк по batch_size записей.
+
+    Parquet нельзя дописать, поэтому каждое открытие пишет новую часть path-1,
+    path-2, ...: продолжение прерванного обхода добавляет часть к уже записанным.
+    Часть, запись которой оборвалась вместе с процессом, остается без футера и
+    не читается; остальные части это не затрагивает.
+    """
+    def __init__(self, path, batch_size=1000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Для экспорта в Parquet установите пакет pyarrow")
+        self.pa = pyarrow
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.rows = []
+        string = pyarrow.string()
+        self.schema = pyarrow.schema(
+            [(field, string) for field in EXPORT_FIELDS if field != 'images']
+            + [('images', pyarrow.list_(string))]
+        )
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path, self.file = open_part(path)
+        self.writer = pyarrow.parquet.ParquetWriter(self.file, self.schema)
+
+    def write(self, record):
+        with self.lock:
+            self.rows.append(record)
+            if len(self.rows) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.writer.close()
+            self.file.close()
+
+
+def open_exporter(path, export_format=None, run_id=None):
+    """Создает экспортер по формату или расширению файла: .jsonl, .jsonl.gz, .jsonl.zst, .parquet.
+
+    JSONL дописывается в path от обхода к обходу. Parquet пишется в отдельные файлы
+    каждого обхода (export-000012-1.parquet, см. run_export_path и ParquetExporter),
+    прежние файлы остаются нетронутыми.
+    """
+    export_format = export_format or os.getenv('EXPORT_FORMAT')
+    if not export_format:
+        if path.endswith('.parquet'):
+            export_format = 'parquet'
+        elif path.endswith('.gz'):
+            export_format = 'jsonl.gz'
+        elif path.endswith('.zst'):
+            export_format = 'jsonl.zst'
+        else:
+            export_format = 'jsonl'
+    if export_format == 'parquet':
+        return ParquetExporter(run_export_path(path, run_id), int(os.getenv('EXPORT_BATCH_SIZE', '1000')))
+    if export_format == 'jsonl.gz':
+        return JsonlExporter(path, 'gzip')
+    if export_format == 'jsonl.zst':
+        return JsonlExporter(path, 'zstd')
+    if export_format == 'jsonl':
+        return JsonlExporter(path)
+    raise ValueError(f"Неизвестный формат экспорта: {export_format}")
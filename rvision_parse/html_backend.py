@@ -0,0 +1,104 @@
+"""Выбор HTML-парсера и ограничение разбора нужными узлами страницы.
+
+Проверка, что разные парсеры дают одинаковый результат на сохраненных страницах:
+
+    python -m rvision_parse.html_backend page1.html page2.html
+
+Без аргументов проверяется корпус страниц из каталога fixtures пакета.
+"""
+import os
+import re
+import sys
+import importlib.util
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Узлы статьи: хлебные крошки, заголовок и блок содержимого (проблема и решение внутри него)
+# Во время разбора class еще не разбит на список, поэтому совпадение ищем по целому слову
+ARTICLE_NODES = SoupStrainer(
+    ["li", "h1", "div"],
+    class_=re.compile(r"(^|\s)(breadcrumbs__item|kb-article-title|kb-article-content)(\s|$)"),
+)
+
+# Узлы списка статей категории: ссылки (статьи и кнопка "показать еще") и поле смещения.
+# Фильтр только по имени тега одинаково работает во всех версиях bs4
+LISTING_NODES = SoupStrainer(["a", "input"])
+
+# Блоки разделов на главной странице
+HOME_NODES = SoupStrainer("div", class_=re.compile(r"(^|\s)knowBaze(\s|$)"))
+
+# Сохраненные страницы статей для проверки парсеров
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def default_backend():
+    """Парсер из HTML_PARSER или самый быстрый из установленных"""
+    backend = os.getenv('HTML_PARSER')
+    if backend:
+        return backend
+    if importlib.util.find_spec("lxml") is not None:
+        return "lxml"
+    return "html.parser"
+
+
+def make_soup(markup, parse_only=None, backend=None):
+    """Разбирает HTML выбранным парсером, строя дерево только для parse_only"""
+    return BeautifulSoup(markup, backend or default_backend(), parse_only=parse_only)
+
+
+def available_backends():
+    backends = ["html.parser"]
+    if importlib.util.find_spec("lxml") is not None:
+        backends.append("lxml")
+    return backends
+
+
+def extract(markup, backend, parse_only):
+    """Данные статьи, по которым сравниваются парсеры"""
+    from .parser import ArticlePage
+
+    article = ArticlePage("", make_soup(markup, parse_only, backend))
+    return {
+        'navigation': article.navigation,
+        'title': article.title,
+        'content_text': article.content_text,
+        'images': article.images,
+        'markdown': article.content.text if article.content else None,
+    }
+
+
+def check_parity(markup):
+    """Сравнивает извлеченные данные всех парсеров с полным разбором html.parser"""
+    reference = extract(markup, "html.parser", None)
+    mismatches = []
+    for backend in available_backends():
+        for parse_only in (None, ARTICLE_NODES):
+            result = extract(markup, backend, parse_only)
+            if result != reference:
+                label = f"{backend}{' +strainer' if parse_only else ''}"
+                mismatches.append((label, result))
+    return reference, mismatches
+
+
+def main():
+    paths = sys.argv[1:] or [
+        os.path.join(FIXTURES_DIR, name) for name in sorted(os.listdir(FIXTURES_DIR)) if name.endswith(".html")
+    ]
+    pages = [(path, open(path, encoding='utf-8').read()) for path in paths]
+
+    failed = False
+    for name, markup in pages:
+        reference, mismatches = check_parity(markup)
+        for label, result in mismatches:
+            failed = True
+            print(f"{name}: {label} отличается от html.parser")
+            for key in reference:
+                if reference[key] != result[key]:
+                    print(f"  {key}: {reference[key]!r} != {result[key]!r}")
+        if not mismatches:
+            print(f"{name}: совпадает ({', '.join(available_backends())})")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+from .metrics import metrics
+
+
+class HttpCache:
+    """Дисковый кэш валидаторов HTTP (ETag, Last-Modified) и дайджестов тела по URL"""
+    EVICT_CHECK_INTERVAL = 100
+
+    def __init__(self, path, max_entries=None):
+        self.path = path
+        self.max_entries = max_entries or int(os.getenv('HTTP_CACHE_MAX_ENTRIES', '100000'))
+        self.lock = threading.Lock()
+        self.stores_since_evict = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT,"
+            " digest TEXT, size INTEGER, accessed REAL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self.connection.commit()
+
+    @staticmethod
+    def digest(body):
+        return hashlib.sha256(body).hexdigest()
+
+    def lookup(self, url):
+        """Возвращает сохраненную запись для URL или None"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT etag, last_modified, digest, size FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'etag': row[0], 'last_modified': row[1], 'digest': row[2], 'size': row[3]}
+
+    def conditional_headers(self, url):
+        """Заголовки If-None-Match / If-Modified-Since для условного запроса"""
+        entry = self.lookup(url)
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def entry_for(self, response, digest=None, size=None):
+        """Формирует запись кэша по ответу сервера.
+
+        Для потоковых ответов digest и size передаются явно, чтобы не читать тело в память.
+        """
+        if digest is None:
+            body = response.content
+            digest = self.digest(body)
+            size = len(body)
+        return {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'digest': digest,
+            'size': size,
+        }
+
+    def not_modified(self, url, response):
+        """Проверяет ответ 304 без чтения тела"""
+        if response.status_code == 304:
+            self.touch(url)
+            metrics.inc("http_cache_hits_total", reason="not_modified")
+            return True
+        return False
+
+    def is_unchanged(self, url, response):
+        """Проверяет, что ресурс не изменился: ответ 304 или совпадающий дайджест тела"""
+        if self.not_modified(url, response):
+            return True
+        if response.status_code != 200:
+            return False
+        entry = self.lookup(url)
+        if entry and entry['digest'] == self.digest(response.content):
+            self.touch(url)
+            metrics.inc("http_cache_hits_total", reason="same_digest")
+            return True
+        return False
+
+    def touch(self, url):
+        with self.lock:
+            self.connection.execute("UPDATE entries SET accessed = ? WHERE url = ?", (time.time(), url))
+            self.connection.commit()
+
+    def store(self, url, entry):
+        """Сохраняет запись после успешной обработки ресурса"""
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries (url, etag, last_modified, digest, size, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (url, entry['etag'], entry['last_modified'], entry['digest'], entry['size'], time.time()),
+            )
+            self.connection.commit()
+            self.stores_since_evict += 1
+            if self.stores_since_evict >= self.EVICT_CHECK_INTERVAL:
+                self.stores_since_evict = 0
+                self.evict()
+
+    def evict(self):
+        """Удаляет давно не использованные записи сверх лимита"""
+        count = self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.connection.execute(
+                "DELETE FROM entries WHERE url IN (SELECT url FROM entries ORDER BY accessed LIMIT ?)",
+                (excess,),
+            )
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,119 @@
+import os
+import time
+import random
+import logging
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import metrics
+
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+
+class HttpClient:
+    """Общая HTTP-сессия: пул keep-alive соединений, таймауты и повторы с backoff"""
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, cookies=None, rate_limiter=None, pool_size=None, connect_timeout=None,
+                 read_timeout=None, max_retries=None, backoff=None, max_backoff=60.0, concurrency=None):
+        self.rate_limiter = rate_limiter
+        # Адаптивный лимит одновременных запросов к хосту (HostConcurrencyLimiter)
+        self.concurrency = concurrency
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else float(os.getenv('HTTP_CONNECT_TIMEOUT', '5')),
+            read_timeout if read_timeout is not None else float(os.getenv('HTTP_READ_TIMEOUT', '30')),
+        )
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('HTTP_RETRIES', '3'))
+        self.backoff = backoff if backoff is not None else float(os.getenv('HTTP_BACKOFF', '0.5'))
+        self.max_backoff = max_backoff
+
+        pool_size = pool_size or int(os.getenv('HTTP_POOL_SIZE', '10'))
+        self.session = requests.Session()
+        # Повторы делаем сами, чтобы учитывать Retry-After и ограничитель частоты
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        if cookies:
+            self.session.cookies.update(cookies)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        """Выполняет запрос, повторяя его при сетевых ошибках и ответах 429/5xx"""
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire(url)
+            slot = self.concurrency.acquire(url) if self.concurrency else None
+            started = time.perf_counter()
+            status = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+                status = response.status_code
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.inc("http_requests_total", method=method, status=type(e).__name__)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                logging.warning(f"Ошибка сети при запросе {url}: {e}. Повтор через {delay:.1f} с")
+            else:
+                self.record_response(method, response, time.perf_counter() - started, kwargs.get("stream"))
+                if response.status_code not in self.RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                delay = self.retry_after(response)
+                if delay is None:
+                    delay = self.backoff_delay(attempt)
+                logging.warning(f"Ответ {response.status_code} для {url}. Повтор через {delay:.1f} с")
+                response.close()
+            finally:
+                # Для потоковых ответов слот освобождается после заголовков, тело читается уже без него
+                if slot:
+                    slot.release(time.perf_counter() - started, status)
+            metrics.inc("http_retries_total", method=method)
+            time.sleep(delay)
+            attempt += 1
+
+    def record_response(self, method, response, elapsed, stream):
+        """Учитывает ответ в метриках; тело потокового ответа не читается"""
+        metrics.inc("http_requests_total", method=method, status=response.status_code)
+        metrics.observe("http_request_seconds", elapsed, method=method)
+        if stream:
+            size = int(response.headers.get("Content-Length") or 0)
+        else:
+            size = len(response.content)
+        metrics.inc("http_response_bytes_total", size)
+
+    def backoff_delay(self, attempt):
+        """Экспоненциальная задержка с джиттером"""
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def retry_after(self, response):
+        """Разбирает заголовок Retry-After (секунды или HTTP-дата)"""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                return None
+        return min(self.max_backoff, max(0.0, delay))
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,314 @@
+"""Постобработка изображений в пуле процессов: формат, пережатие, миниатюры и поиск похожих.
+
+Включается переменными окружения (нужен пакет Pillow):
+
+    IMAGE_OPTIMIZE=webp|png   пережать новые изображения в WebP или оптимизированный PNG
+    IMAGE_QUALITY=80          качество WebP с потерями; по умолчанию WebP без потерь
+    IMAGE_THUMBNAIL=320       миниатюры в images/thumbs с наибольшей стороной в пикселях
+    IMAGE_DEDUP=1             перцептивный хэш (dHash) и поиск почти одинаковых скриншотов
+    IMAGE_PROCESSES=4         число процессов, по умолчанию по числу ядер
+
+Пережимаются только изображения, впервые скачанные в текущем обходе: на уже
+лежащие в хранилище файлы могут ссылаться сохраненные ранее статьи. Пережатый
+файл остается под SHA-256 исходного содержимого, меняется только расширение.
+
+Обработать уже собранное дерево (миниатюры и хэши) и вывести группы похожих изображений:
+
+    python -m rvision_parse.image_pipeline knowledge_base
+"""
+import os
+import sys
+import logging
+import sqlite3
+import multiprocessing
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from .atomic import apply_default_mode
+from .metrics import metrics
+
+# Для оценки похожести: изображения с расстоянием Хэмминга dHash не больше порога
+DEFAULT_DISTANCE = 4
+
+
+def dhash(image, size=8):
+    """64-битный разностный хэш: сравнение соседних пикселей уменьшенной серой копии"""
+    from PIL import Image
+
+    pixels = image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS).tobytes()
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = bits << 1 | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def encode(image, path, image_format, quality=None):
+    """Сохраняет изображение в WebP или оптимизированный PNG (режим PNG не меняется)"""
+    if image_format == "webp":
+        if image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode == "P" else "RGB")
+        if quality:
+            image.save(path, "WEBP", quality=quality, method=6)
+        else:
+            image.save(path, "WEBP", lossless=True, method=6)
+    else:
+        image.save(path, "PNG", optimize=True)
+
+
+def process_image(path, options):
+    """Обрабатывает один файл; выполняется в дочернем процессе.
+
+    Возвращает метаданные, путь к пережатому временному файлу (если он меньше
+    исходного) и имя миниатюры.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    directory, name = os.path.split(path)
+    digest = name.split(".")[0]
+    result = {'format': None, 'width': None, 'height': None, 'dhash': None,
+              'optimized': None, 'thumbnail': None, 'size': os.path.getsize(path)}
+    try:
+        with Image.open(path) as image:
+            image.load()
+            result['format'] = (image.format or "").lower()
+            result['width'], result['height'] = image.size
+            if options['dedup']:
+                result['dhash'] = f"{dhash(image):016x}"
+
+            if options['thumbnail']:
+                thumbs = os.path.join(directory, "thumbs")
+                os.makedirs(thumbs, exist_ok=True)
+                thumb_name = f"{digest}.webp"
+                thumb = image.copy()
+                thumb.thumbnail((options['thumbnail'], options['thumbnail']))
+                fd, temp_path = tempfile.mkstemp(dir=thumbs, prefix=".tmp-", suffix=".webp")
+                os.close(fd)
+                encode(thumb, temp_path, "webp", 80)
+                apply_default_mode(temp_path)
+                os.replace(temp_path, os.path.join(thumbs, thumb_name))
+                result['thumbnail'] = f"thumbs/{thumb_name}"
+
+            target = options['optimize'] if options['recompress'] else None
+            # Анимацию и уже сжатые с потерями форматы без потерь не пережимаем
+            if target == "png" and result['format'] != "png":
+                target = None
+            if target and not getattr(image, "is_animated", False):
+                fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=f".{target}")
+                os.close(fd)
+                encode(image, temp_path, target, options['quality'])
+                apply_default_mode(temp_path)
+                if os.path.getsize(temp_path) < result['size']:
+                    result['optimized'] = temp_path
+                else:
+                    os.unlink(temp_path)
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        # SVG, ICO с необычной структурой и поврежденные файлы остаются как есть
+        result['error'] = str(e)
+    return result
+
+
+class DuplicateIndex:
+    """Поиск близких dHash без полного перебора.
+
+    Хэш делится на max_distance + 1 полос: у хэшей на расстоянии не больше
+    max_distance хотя бы одна полоса совпадает точно.
+    """
+    def __init__(self, max_distance=DEFAULT_DISTANCE, bits=64):
+        self.max_distance = max_distance
+        count = max_distance + 1
+        width = bits // count
+        self.bands = [(i * width, bits if i == count - 1 else (i + 1) * width) for i in range(count)]
+        self.buckets = [{} for _ in self.bands]
+
+    def keys(self, value):
+        return [(value >> start) & ((1 << (end - start)) - 1) for start, end in self.bands]
+
+    def find(self, value):
+        """Самый близкий ранее добавленный digest и расстояние, либо (None, None)"""
+        best = (None, None)
+        for bucket, key in zip(self.buckets, self.keys(value)):
+            for other, digest in bucket.get(key, ()):
+                distance = bin(value ^ other).count("1")
+                if distance <= self.max_distance and (best[1] is None or distance < best[1]):
+                    best = (digest, distance)
+        return best
+
+    def add(self, value, digest):
+        for bucket, key in zip(self.buckets, self.keys(value)):
+            bucket.setdefault(key, []).append((value, digest))
+
+
+class ImageIndex:
+    """Метаданные обработанных изображений в SQLite рядом с манифестом"""
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            " digest TEXT PRIMARY KEY, name TEXT, format TEXT, width INTEGER, height INTEGER,"
+            " original_size INTEGER, size INTEGER, dhash TEXT, thumbnail TEXT,"
+            " duplicate_of TEXT, distance INTEGER)"
+        )
+        self.connection.commit()
+
+    def load(self):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT digest, name, dhash FROM images ORDER BY rowid"
+            ).fetchall()
+
+    def record(self, digest, name, meta, duplicate_of=None, distance=None):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (digest, name, meta['format'], meta['width'], meta['height'], meta['size'],
+                 meta.get('final_size', meta['size']), meta['dhash'], meta['thumbnail'],
+                 duplicate_of, distance),
+            )
+            self.connection.commit()
+
+    def duplicates(self):
+        """Группы похожих изображений: исходное имя -> [(имя, расстояние)]"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT original.name, copy.name, copy.distance FROM images copy"
+                " JOIN images original ON original.digest = copy.duplicate_of"
+                " ORDER BY original.name, copy.distance"
+            ).fetchall()
+        groups = {}
+        for original, name, distance in rows:
+            groups.setdefault(original, []).append((name, distance))
+        return groups
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class ImagePipeline:
+    """Постобработка изображений хранилища в пуле процессов"""
+    def __init__(self, store, index_path, optimize=None, quality=None, thumbnail=None,
+                 dedup=None, processes=None):
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            raise RuntimeError("Для обработки изображений установите пакет Pillow")
+        self.store = store
+        self.optimize = optimize if optimize is not None else os.getenv('IMAGE_OPTIMIZE') or None
+        if self.optimize not in (None, "webp", "png"):
+            raise ValueError(f"Неизвестный формат пережатия изображений: {self.optimize}")
+        self.quality = quality if quality is not None else int(os.getenv('IMAGE_QUALITY', '0')) or None
+        self.thumbnail = thumbnail if thumbnail is not None else int(os.getenv('IMAGE_THUMBNAIL', '0'))
+        self.dedup = dedup if dedup is not None else os.getenv('IMAGE_DEDUP') == '1'
+        self.processes = processes or int(os.getenv('IMAGE_PROCESSES', '0')) or os.cpu_count() or 1
+        # Не fork: в родителе уже работают потоки загрузки и открыты SQLite, дочерний процесс может зависнуть
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context(start_method))
+        self.index = ImageIndex(index_path)
+        self.duplicates = DuplicateIndex()
+        self.lock = threading.Lock()
+        self.pending = {}  # digest -> Future с итоговым именем, чтобы не обрабатывать блоб дважды
+        self.names = {}  # digest -> имя обработанного файла
+        for digest, name, hash_hex in self.index.load():
+            self.names[digest] = name
+            if hash_hex:
+                self.duplicates.add(int(hash_hex, 16), digest)
+
+    @staticmethod
+    def enabled():
+        return bool(os.getenv('IMAGE_OPTIMIZE') or int(os.getenv('IMAGE_THUMBNAIL', '0'))
+                    or os.getenv('IMAGE_DEDUP') == '1')
+
+    def process(self, name, digest, recompress=False):
+        """Обрабатывает блоб и возвращает его итоговое имя в хранилище.
+
+        recompress=True только для файлов, созданных в этом обходе.
+        """
+        with self.lock:
+            known = self.names.get(digest)
+            if known:
+                return known
+            waiter = self.pending.get(digest)
+            if waiter is not None:
+                owner = False
+            else:
+                waiter = self.pending[digest] = Future()
+                owner = True
+        if not owner:
+            return waiter.result()
+
+        options = {
+            'optimize': self.optimize, 'quality': self.quality, 'thumbnail': self.thumbnail,
+            'dedup': self.dedup, 'recompress': recompress,
+        }
+        try:
+            meta = self.executor.submit(
+                process_image, os.path.join(self.store.directory, name), options
+            ).result()
+            name = self.finish(name, digest, meta)
+        except Exception as e:
+            # Необработанный файл остается пригодным; обработка повторится в следующий раз
+            logging.error(f"Ошибка при обработке изображения {name}: {e}")
+        finally:
+            with self.lock:
+                self.pending.pop(digest, None)
+            waiter.set_result(name)
+        return name
+
+    def finish(self, name, digest, meta):
+        """Подменяет файл пережатым вариантом и записывает метаданные"""
+        if meta.get('error'):
+            logging.debug(f"Изображение {name} не обработано: {meta['error']}")
+        if meta['optimized']:
+            extension = os.path.splitext(meta['optimized'])[1]
+            meta['final_size'] = os.path.getsize(meta['optimized'])
+            name = self.store.replace(digest, meta['optimized'], extension)
+            metrics.inc("image_bytes_saved_total", meta['size'] - meta['final_size'])
+        duplicate_of = distance = None
+        if meta['dhash']:
+            value = int(meta['dhash'], 16)
+            with self.lock:
+                duplicate_of, distance = self.duplicates.find(value)
+                self.duplicates.add(value, digest)
+            if duplicate_of:
+                metrics.inc("image_duplicates_total")
+        self.index.record(digest, name, meta, duplicate_of, distance)
+        metrics.inc("images_processed_total")
+        with self.lock:
+            self.names[digest] = name
+        return name
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.index.close()
+
+
+def main():
+    from .image_store import ImageStore, BLOB_NAME_RE
+
+    base_dir = sys.argv[1] if len(sys.argv) > 1 else "knowledge_base"
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    store = ImageStore(os.path.join(base_dir, "images"))
+    # Уже собранные файлы не пережимаются: на них ссылаются сохраненные статьи
+    pipeline = ImagePipeline(store, os.path.join(base_dir, ".images.sqlite"), dedup=True)
+    try:
+        blobs = [match for match in map(BLOB_NAME_RE.match, sorted(os.listdir(store.directory))) if match]
+        with ThreadPoolExecutor(pipeline.processes) as executor:
+            list(executor.map(lambda match: pipeline.process(match.group(0), match.group(1)), blobs))
+        groups = pipeline.index.duplicates()
+    finally:
+        pipeline.close()
+
+    print(f"Изображений: {len(pipeline.names)}, групп похожих: {len(groups)}")
+    for original, copies in groups.items():
+        print(original)
+        for name, distance in copies:
+            print(f"  {name} (расстояние {distance})")
+
+
+if __name__ == "__main__":
+    main()
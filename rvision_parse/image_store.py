@@ -0,0 +1,136 @@
+import os
+import re
+import hashlib
+import tempfile
+import threading
+
+from .atomic import apply_default_mode
+
+CONTENT_TYPE_EXTENSIONS = {
+    'image/png': '.png',
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'image/bmp': '.bmp',
+    'image/svg+xml': '.svg',
+    'image/x-icon': '.ico',
+    'image/vnd.microsoft.icon': '.ico',
+}
+
+MAGIC_EXTENSIONS = [
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+    (b'BM', '.bmp'),
+    (b'\x00\x00\x01\x00', '.ico'),
+]
+
+BLOB_NAME_RE = re.compile(r"^([0-9a-f]{64})(\.[a-z0-9]+)$")
+
+
+def detect_extension(head, content_type=None):
+    """Определяет расширение по сигнатуре файла, а при неудаче - по Content-Type"""
+    for magic, extension in MAGIC_EXTENSIONS:
+        if head.startswith(magic):
+            return extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    if b'<svg' in head[:512].lower():
+        return '.svg'
+    if content_type:
+        extension = CONTENT_TYPE_EXTENSIONS.get(content_type.split(';')[0].strip().lower())
+        if extension:
+            return extension
+    return '.bin'
+
+
+class ImageStore:
+    """Хранилище изображений, адресуемое SHA-256 содержимого.
+
+    Файл называется <sha256><расширение>, поэтому одинаковые картинки из разных
+    статей хранятся один раз, а имена не зависят от порядка обхода.
+    """
+    def __init__(self, directory, chunk_size=64 * 1024):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Индекс уже сохраненных блобов: digest -> имя файла
+        self.blobs = {}
+        for name in os.listdir(directory):
+            match = BLOB_NAME_RE.match(name)
+            if match:
+                self.blobs[match.group(1)] = name
+
+    def find(self, digest):
+        """Возвращает имя файла для digest, если блоб уже сохранен"""
+        with self.lock:
+            return self.blobs.get(digest)
+
+    def save_stream(self, response):
+        """Потоково сохраняет тело ответа и возвращает (имя файла, digest, создан ли новый файл)"""
+        digest = hashlib.sha256()
+        head = b''
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(self.chunk_size):
+                    if not chunk:
+                        continue
+                    if len(head) < 512:
+                        head += chunk[:512 - len(head)]
+                    digest.update(chunk)
+                    f.write(chunk)
+            digest = digest.hexdigest()
+            existing = self.find(digest)
+            if existing:
+                os.unlink(temp_path)
+                return existing, digest, False
+            name = digest + detect_extension(head, response.headers.get('Content-Type'))
+            apply_default_mode(temp_path)
+            # Одинаковое содержимое под одним именем: гонка двух потоков безопасна
+            os.replace(temp_path, os.path.join(self.directory, name))
+            with self.lock:
+                self.blobs[digest] = name
+            return name, digest, True
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def remove(self, digest):
+        """Удаляет блоб и его миниатюру; возвращает пути удаленных файлов относительно хранилища"""
+        with self.lock:
+            name = self.blobs.pop(digest, None)
+        if name is None:
+            return []
+        removed = []
+        for relative in (name, f"thumbs/{digest}.webp"):
+            try:
+                os.unlink(os.path.join(self.directory, relative))
+                removed.append(relative)
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def replace(self, digest, temp_path, extension):
+        """Подменяет блоб digest пережатым файлом temp_path и возвращает новое имя.
+
+        Имя по-прежнему строится от digest исходного содержимого, чтобы HTTP-кэш
+        и манифест продолжали находить файл.
+        """
+        name = digest + extension
+        os.replace(temp_path, os.path.join(self.directory, name))
+        with self.lock:
+            old = self.blobs.get(digest)
+            self.blobs[digest] = name
+        if old and old != name:
+            try:
+                os.unlink(os.path.join(self.directory, old))
+            except OSError:
+                pass
+        return name
@@ -0,0 +1,284 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+
+ARTICLE_ID_RE = re.compile(r"/knowledge_base/item/(\d+)")
+
+
+def article_id(url):
+    """Извлекает ID статьи из URL; параметры вроде ?sid= не учитываются"""
+    match = ARTICLE_ID_RE.search(url)
+    if match:
+        return match.group(1)
+    return url.split('?')[0]
+
+
+class CrawlManifest:
+    """Постоянный индекс статей: путь файла, хэши содержимого и изображений, время загрузки.
+
+    Пути файлов хранятся относительно каталога манифеста (base_dir) и выдаются
+    абсолютными, поэтому не зависят от текущего каталога процесса.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.lock = threading.Lock()
+        self.run_id = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            " article_id TEXT PRIMARY KEY, url TEXT, output_path TEXT, content_hash TEXT,"
+            " image_hashes TEXT, fetched_at REAL, run_id INTEGER, article_format TEXT, image_count INTEGER);"
+            "CREATE INDEX IF NOT EXISTS articles_run ON articles (run_id);"
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id INTEGER PRIMARY KEY AUTOINCREMENT, started_at REAL, finished_at REAL);"
+            # Журнал изменений дерева за обход для выпуска changeset
+            "CREATE TABLE IF NOT EXISTS changes ("
+            " change_id INTEGER PRIMARY KEY AUTOINCREMENT, run_id INTEGER, op TEXT, kind TEXT,"
+            " path TEXT, article_id TEXT, digest TEXT);"
+            "CREATE INDEX IF NOT EXISTS changes_run ON changes (run_id);"
+        )
+        # Манифесты прежних версий: формат файла и число изображений статьи не хранились
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(articles)")}
+        for column, kind in (("article_format", "TEXT"), ("image_count", "INTEGER")):
+            if column not in columns:
+                self.connection.execute(f"ALTER TABLE articles ADD COLUMN {column} {kind}")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] < 1:
+            self.relativize_paths()
+            self.connection.execute("PRAGMA user_version = 1")
+        self.connection.commit()
+        self.processed = ProcessedArticles(self)
+
+    def relativize_paths(self):
+        """Переводит пути прежних версий (относительно текущего каталога) в пути от base_dir"""
+        rows = self.connection.execute(
+            "SELECT article_id, output_path FROM articles WHERE output_path IS NOT NULL"
+        ).fetchall()
+        for key, path in rows:
+            relative = os.path.relpath(os.path.abspath(path), self.directory)
+            if not relative.startswith(os.pardir):
+                self.connection.execute(
+                    "UPDATE articles SET output_path = ? WHERE article_id = ?", (relative, key)
+                )
+
+    def stored_path(self, path):
+        """Путь файла в том виде, в каком он хранится в манифесте"""
+        return os.path.relpath(os.path.abspath(path), self.directory)
+
+    def resolve_path(self, stored):
+        return os.path.join(self.directory, stored) if stored else stored
+
+    def open_run(self):
+        """Незавершенный (прерванный или идущий) обход или None"""
+        with self.lock:
+            return self.unfinished_run()
+
+    def unfinished_run(self):
+        row = self.connection.execute(
+            "SELECT run_id FROM runs WHERE finished_at IS NULL ORDER BY run_id DESC LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    def begin_run(self):
+        """Продолжает незавершенный обход или начинает новый"""
+        with self.lock:
+            run_id = self.unfinished_run()
+            if run_id is not None:
+                self.run_id = run_id
+            else:
+                cursor = self.connection.execute("INSERT INTO runs (started_at) VALUES (?)", (time.time(),))
+                self.connection.commit()
+                self.run_id = cursor.lastrowid
+            return self.run_id
+
+    def finish_run(self):
+        with self.lock:
+            if self.run_id is not None:
+                self.connection.execute(
+                    "UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id)
+                )
+                self.connection.commit()
+                self.run_id = None
+
+    def current_run(self):
+        """Текущий обход; начинает его при первой записи. Запросы на чтение его не начинают"""
+        if self.run_id is None:
+            return self.begin_run()
+        return self.run_id
+
+    def get(self, url):
+        """Возвращает запись статьи по URL или ID"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT article_id, url, output_path, content_hash, image_hashes, fetched_at, run_id,"
+                " article_format, image_count FROM articles WHERE article_id = ?",
+                (article_id(url),),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'article_id': row[0],
+            'url': row[1],
+            'output_path': self.resolve_path(row[2]),
+            'content_hash': row[3],
+            'image_hashes': json.loads(row[4]) if row[4] else [],
+            'fetched_at': row[5],
+            'run_id': row[6],
+            'article_format': row[7],
+            'image_count': row[8],
+        }
+
+    def record(self, url, output_path, content_hash, image_hashes, article_format=None, image_count=None):
+        """Сохраняет результат обработки статьи.
+
+        image_hashes - только успешно загруженные изображения, image_count - сколько их в статье.
+        """
+        run_id = self.current_run()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO articles"
+                " (article_id, url, output_path, content_hash, image_hashes, fetched_at, run_id,"
+                " article_format, image_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (article_id(url), url, self.stored_path(output_path), content_hash,
+                 json.dumps(image_hashes), time.time(), run_id, article_format,
+                 len(image_hashes) if image_count is None else image_count),
+            )
+            self.connection.commit()
+
+    def path_in_use(self, path):
+        """Ссылается ли на файл какая-либо статья (у одноименных статей категории файл общий)"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM articles WHERE output_path = ? LIMIT 1", (self.stored_path(path),)
+            ).fetchone()
+        return row is not None
+
+    def mark_seen(self, url):
+        """Отмечает статью как обработанную в текущем обходе"""
+        run_id = self.current_run()
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO articles (article_id, url, run_id) VALUES (?, ?, ?)"
+                " ON CONFLICT(article_id) DO UPDATE SET run_id = excluded.run_id",
+                (article_id(url), url, run_id),
+            )
+            self.connection.commit()
+
+    def seen_in_run(self, url):
+        run_id = self.run_id
+        if run_id is None:
+            return False
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM articles WHERE article_id = ? AND run_id = ?", (article_id(url), run_id)
+            ).fetchone()
+        return row is not None
+
+    def count_seen(self):
+        run_id = self.run_id
+        if run_id is None:
+            return 0
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM articles WHERE run_id = ?", (run_id,)
+            ).fetchone()[0]
+
+    def iter_seen(self):
+        run_id = self.run_id
+        if run_id is None:
+            return iter(())
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT url FROM articles WHERE run_id = ?", (run_id,)
+            ).fetchall()
+        return (row[0] for row in rows)
+
+    def previous_run(self, run_id):
+        """Последний завершенный обход до run_id или None"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT MAX(run_id) FROM runs WHERE run_id < ? AND finished_at IS NOT NULL", (run_id,)
+            ).fetchone()
+        return row[0]
+
+    def record_change(self, op, kind, path, article_id=None, digest=None):
+        """Добавляет операцию (add, modify, delete, release) в журнал текущего обхода"""
+        run_id = self.current_run()
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO changes (run_id, op, kind, path, article_id, digest) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, op, kind, path, article_id, digest),
+            )
+            self.connection.commit()
+
+    def iter_changes(self, run_id):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT op, kind, path, article_id, digest FROM changes WHERE run_id = ? ORDER BY change_id",
+                (run_id,),
+            ).fetchall()
+        return [
+            {'op': op, 'kind': kind, 'path': path, 'article_id': article, 'digest': digest}
+            for op, kind, path, article, digest in rows
+        ]
+
+    def iter_stale(self):
+        """Статьи, не встреченные в текущем обходе: кандидаты на удаление"""
+        run_id = self.run_id
+        if run_id is None:
+            return []
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT article_id, url, output_path FROM articles WHERE run_id IS NOT ?", (run_id,)
+            ).fetchall()
+        return [
+            {'article_id': row[0], 'url': row[1], 'output_path': self.resolve_path(row[2])}
+            for row in rows
+        ]
+
+    def delete(self, url):
+        """Удаляет статью из манифеста и возвращает хэши ее изображений"""
+        entry = self.get(url)
+        with self.lock:
+            self.connection.execute("DELETE FROM articles WHERE article_id = ?", (article_id(url),))
+            self.connection.commit()
+        return entry['image_hashes'] if entry else []
+
+    def referenced_images(self):
+        """SHA-256 всех изображений, на которые ссылаются статьи"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT image_hashes FROM articles WHERE image_hashes IS NOT NULL"
+            ).fetchall()
+        referenced = set()
+        for (hashes,) in rows:
+            referenced.update(json.loads(hashes))
+        return referenced
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class ProcessedArticles:
+    """Множество статей, обработанных в текущем обходе, хранящееся в манифесте"""
+    def __init__(self, manifest):
+        self.manifest = manifest
+
+    def __contains__(self, url):
+        return self.manifest.seen_in_run(url)
+
+    def add(self, url):
+        self.manifest.mark_seen(url)
+
+    def __len__(self):
+        return self.manifest.count_seen()
+
+    def __iter__(self):
+        return self.manifest.iter_seen()
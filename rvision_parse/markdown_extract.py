@@ -0,0 +1,288 @@
+"""Однопроходное извлечение содержимого статьи в Markdown.
+
+Блок kb-article-content обходится один раз: по пути собираются Markdown-текст
+(заголовки, списки, таблицы, код, метки изображений), плоский текст для хэша,
+адреса изображений и отдельно текст блоков problem и solution. Фрагменты
+копятся в списках и склеиваются один раз на абзац.
+"""
+from bs4 import Tag, NavigableString, CData
+
+# Перенос строки от <br>; пробелы внутри абзаца схлопываются один раз при его завершении
+LINE_BREAK = "\x01"
+
+HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+BLOCKS = {
+    "p", "div", "section", "article", "header", "footer", "main", "aside", "nav",
+    "figure", "figcaption", "dl", "dt", "dd", "center", "form", "details", "summary", "address",
+}
+EMPHASIS = {"strong": "**", "b": "**", "em": "*", "i": "*", "s": "~~", "del": "~~", "strike": "~~"}
+SKIPPED = {"script", "style", "template", "noscript", "head"}
+
+
+class ArticleContent:
+    """Результат извлечения: Markdown, плоский текст, изображения, проблема и решение"""
+    def __init__(self, text, plain_text, images, problem, solutions):
+        self.text = text
+        # Совпадает с get_text(strip=True), чтобы хэш статьи не зависел от разметки Markdown
+        self.plain_text = plain_text
+        self.images = images
+        self.problem = problem
+        self.solutions = solutions
+
+
+class MarkdownExtractor:
+    """Обходит дерево один раз; изображения заменяются метками image_marker.format(номер)"""
+    def __init__(self, image_marker, string_types=(NavigableString, CData)):
+        self.image_marker = image_marker
+        self.string_types = string_types
+        self.blocks = []  # готовые абзацы текущего контекста
+        self.inline = []  # фрагменты незавершенного абзаца
+        self.plain = []
+        self.images = []
+        self.problem = None
+        self.solutions = []
+        self.in_pre = 0
+
+    def extract(self, root):
+        self.string_types = getattr(root, 'interesting_string_types', None) or self.string_types
+        for child in root.children:
+            self.walk(child)
+        self.flush()
+        return ArticleContent(
+            "\n\n".join(self.blocks), "".join(self.plain), self.images, self.problem, self.solutions,
+        )
+
+    def flush(self):
+        """Завершает текущий абзац"""
+        if not self.inline:
+            return
+        text = "".join(self.inline)
+        self.inline = []
+        lines = [" ".join(line.split()) for line in text.split(LINE_BREAK)]
+        block = "\n".join(line for line in lines if line)
+        if block:
+            self.blocks.append(block)
+
+    def capture(self, nodes):
+        """Обходит узлы в отдельном контексте и возвращает их абзацы"""
+        blocks, inline = self.blocks, self.inline
+        self.blocks, self.inline = [], []
+        for node in nodes:
+            self.walk(node)
+        self.flush()
+        captured = self.blocks
+        self.blocks, self.inline = blocks, inline
+        return captured
+
+    def walk(self, node):
+        if not isinstance(node, Tag):
+            if type(node) in self.string_types:
+                text = str(node)
+                stripped = text.strip()
+                if stripped:
+                    self.plain.append(stripped)
+                self.inline.append(text)
+            return
+
+        name = node.name
+        if name in SKIPPED:
+            return
+        if name == "img":
+            src = node.get('src')
+            if src:
+                self.inline.append(f" {self.image_marker.format(len(self.images))} ")
+                self.images.append(src)
+        elif name == "br":
+            self.inline.append("\n" if self.in_pre else LINE_BREAK)
+        elif name in HEADINGS:
+            self.flush()
+            text = " ".join(self.capture(node.children)).replace("\n", " ")
+            if text:
+                self.blocks.append(f"{'#' * HEADINGS[name]} {text}")
+        elif name in ("ul", "ol"):
+            self.flush()
+            self.walk_list(node)
+        elif name == "table":
+            self.flush()
+            self.walk_table(node)
+        elif name == "pre":
+            self.flush()
+            self.walk_pre(node)
+        elif name == "blockquote":
+            self.flush()
+            lines = "\n\n".join(self.capture(node.children)).split("\n")
+            if lines != [""]:
+                self.blocks.append("\n".join(f"> {line}".rstrip() for line in lines))
+        elif name == "hr":
+            self.flush()
+            self.blocks.append("---")
+        elif name in BLOCKS:
+            self.flush()
+            classes = node.get('class') or ()
+            if name == "div" and ("problem" in classes or "solution" in classes):
+                blocks = self.capture(node.children)
+                self.blocks.extend(blocks)
+                if "problem" in classes and self.problem is None:
+                    self.problem = "\n\n".join(blocks)
+                elif "solution" in classes:
+                    self.solutions.append("\n\n".join(blocks))
+            else:
+                for child in node.children:
+                    self.walk(child)
+                self.flush()
+        elif name == "code" and not self.in_pre:
+            self.wrap_inline(node, "`")
+        elif name in EMPHASIS:
+            self.wrap_inline(node, EMPHASIS[name])
+        elif name == "a":
+            self.walk_link(node)
+        else:
+            for child in node.children:
+                self.walk(child)
+
+    def capture_inline(self, nodes):
+        """Обходит содержимое строчного элемента и возвращает его сырой текст.
+
+        Если внутри оказались блоки, они выводятся как есть, а возвращается None.
+        """
+        blocks, inline = self.blocks, self.inline
+        self.blocks, self.inline = [], []
+        for node in nodes:
+            self.walk(node)
+        captured, raw = self.blocks, "".join(self.inline)
+        self.blocks, self.inline = blocks, inline
+        if captured:
+            self.flush()
+            self.blocks.extend(captured)
+            self.inline.append(raw)
+            return None
+        return raw
+
+    def append_wrapped(self, raw, before, after):
+        """Добавляет текст в обрамлении, сохраняя пробелы по краям для соседних слов"""
+        text = " ".join(raw.split())
+        if not text or LINE_BREAK in raw:
+            self.inline.append(raw)
+            return
+        lead = " " if raw[0].isspace() else ""
+        trail = " " if raw[-1].isspace() else ""
+        self.inline.append(f"{lead}{before}{text}{after}{trail}")
+
+    def wrap_inline(self, node, mark):
+        raw = self.capture_inline(node.children)
+        if raw is not None:
+            self.append_wrapped(raw, mark, mark)
+
+    def walk_link(self, node):
+        raw = self.capture_inline(node.children)
+        if raw is None:
+            return
+        href = node.get('href') or ""
+        if href.startswith(("http://", "https://")) and href != " ".join(raw.split()):
+            self.append_wrapped(raw, "[", f"]({href})")
+        else:
+            self.inline.append(raw)
+
+    def walk_list(self, node):
+        ordered = node.name == "ol"
+        try:
+            number = int(node.get('start', 1))
+        except ValueError:
+            number = 1
+        lines = []
+        for nodes in self.list_items(node):
+            blocks = self.capture(nodes)
+            if not blocks:
+                continue
+            marker = f"{number}. " if ordered else "- "
+            number += 1
+            item = "\n".join(blocks).split("\n")
+            lines.append(marker + item[0])
+            lines.extend(" " * len(marker) + line for line in item[1:])
+        if lines:
+            self.blocks.append("\n".join(lines))
+
+    def list_items(self, node):
+        """Содержимое пунктов списка по порядку.
+
+        Незакрытые <li> html.parser вкладывает друг в друга, а lxml закрывает: li прямо
+        внутри li считается следующим пунктом, чтобы оба парсера давали один список.
+        """
+        for child in node.children:
+            if isinstance(child, Tag) and child.name == "li":
+                yield from self.item_parts(child)
+            else:
+                yield [child]
+
+    def item_parts(self, item):
+        nodes = []
+        for child in item.children:
+            if isinstance(child, Tag) and child.name == "li":
+                yield nodes
+                nodes = []
+                yield from self.item_parts(child)
+            else:
+                nodes.append(child)
+        yield nodes
+
+    def walk_table(self, node):
+        rows = []
+        for row in self.table_rows(node):
+            cells = []
+            for cell in row.children:
+                if not isinstance(cell, Tag) or cell.name not in ("td", "th"):
+                    self.walk(cell)
+                    continue
+                text = "<br>".join(self.capture(cell.children)).replace("\n", "<br>").replace("|", "\\|")
+                cells.append(text)
+                try:
+                    span = int(cell.get('colspan', 1))
+                except ValueError:
+                    span = 1
+                cells.extend([""] * (span - 1))
+            if cells:
+                rows.append(cells)
+        # Подпись и прочий текст вне строк выводятся перед таблицей
+        self.flush()
+        if not rows:
+            return
+        width = max(len(cells) for cells in rows)
+        lines = []
+        for index, cells in enumerate(rows):
+            cells = cells + [""] * (width - len(cells))
+            lines.append("| " + " | ".join(cells) + " |")
+            if index == 0:
+                lines.append("|" + " --- |" * width)
+        self.blocks.append("\n".join(lines))
+
+    def table_rows(self, node):
+        """Строки таблицы без захода во вложенные таблицы"""
+        for child in node.children:
+            if isinstance(child, Tag) and child.name == "tr":
+                yield child
+            elif isinstance(child, Tag) and child.name in ("thead", "tbody", "tfoot"):
+                yield from self.table_rows(child)
+            else:
+                self.walk(child)
+
+    def walk_pre(self, node):
+        language = ""
+        for element in [node, node.find("code", recursive=False)]:
+            for name in (element.get('class') or ()) if element is not None else ():
+                if name.startswith("language-"):
+                    language = name[len("language-"):]
+        blocks, inline = self.blocks, self.inline
+        self.blocks, self.inline = [], []
+        self.in_pre += 1
+        for child in node.children:
+            self.walk(child)
+        self.in_pre -= 1
+        code = "".join(self.inline).strip("\n")
+        self.blocks, self.inline = blocks, inline
+        if code:
+            self.blocks.append(f"```{language}\n{code}\n```")
+
+
+def extract_markdown(root, image_marker):
+    """Извлекает содержимое элемента root за один обход"""
+    return MarkdownExtractor(image_marker).extract(root)
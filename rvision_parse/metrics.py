@@ -0,0 +1,309 @@
+"""Метрики обхода: счетчики, гистограммы времени по стадиям и глубины очередей.
+
+Стадии: fetch (HTTP), parse (построение дерева), extract (извлечение текста),
+image (загрузка изображений), write (запись на диск и в манифест).
+"""
+import os
+import io
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Границы корзин гистограмм времени, в секундах
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами в стиле Prometheus"""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in key) + "}"
+
+
+class Metrics:
+    """Потокобезопасный реестр метрик"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.monotonic()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, _labels_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, stage):
+        """Замеряет длительность стадии в гистограмму stage_seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - started, stage=stage)
+
+    def counter_value(self, name, **labels):
+        """Сумма счетчика по всем меткам, совпадающим с заданными"""
+        wanted = set(labels.items())
+        with self.lock:
+            return sum(
+                value for (counter, key), value in self.counters.items()
+                if counter == name and wanted <= set(key)
+            )
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.started = time.monotonic()
+
+    def snapshot(self):
+        """Текущие значения в виде словаря для JSON"""
+        with self.lock:
+            return {
+                'uptime_seconds': time.monotonic() - self.started,
+                'counters': [
+                    {'name': name, 'labels': dict(key), 'value': value}
+                    for (name, key), value in sorted(self.counters.items())
+                ],
+                'gauges': [
+                    {'name': name, 'labels': dict(key), 'value': value}
+                    for (name, key), value in sorted(self.gauges.items())
+                ],
+                'histograms': [
+                    {
+                        'name': name, 'labels': dict(key), 'count': histogram.count, 'sum': histogram.sum,
+                        'p50': histogram.quantile(0.5), 'p95': histogram.quantile(0.95),
+                        'p99': histogram.quantile(0.99),
+                    }
+                    for (name, key), histogram in sorted(self.histograms.items())
+                ],
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def dump_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_json())
+
+    def to_prometheus(self):
+        """Текстовый формат экспозиции Prometheus"""
+        out = io.StringIO()
+        with self.lock:
+            for (name, key), value in sorted(self.counters.items()):
+                out.write(f"kb_{name}{_format_labels(key)} {value}\n")
+            for (name, key), value in sorted(self.gauges.items()):
+                out.write(f"kb_{name}{_format_labels(key)} {value}\n")
+            for (name, key), histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    labels = _format_labels(key + (('le', bound),))
+                    out.write(f"kb_{name}_bucket{labels} {cumulative}\n")
+                labels = _format_labels(key + (('le', '+Inf'),))
+                out.write(f"kb_{name}_bucket{labels} {histogram.count}\n")
+                out.write(f"kb_{name}_sum{_format_labels(key)} {histogram.sum}\n")
+                out.write(f"kb_{name}_count{_format_labels(key)} {histogram.count}\n")
+        return out.getvalue()
+
+    def summary(self):
+        """Короткая строка для периодического вывода в лог"""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        articles = self.counter_value("articles_total")
+        parts = [
+            f"статей {articles} ({articles / elapsed:.1f}/с)",
+            f"запросов {self.counter_value('http_requests_total')}",
+            f"повторов {self.counter_value('http_retries_total')}",
+            f"попаданий в кэш {self.counter_value('http_cache_hits_total')}",
+            f"МБ {self.counter_value('http_response_bytes_total') / 1e6:.1f}",
+        ]
+        with self.lock:
+            stages = [
+                f"{dict(key)['stage']} p50={histogram.quantile(0.5) * 1000:.0f}мс "
+                f"p95={histogram.quantile(0.95) * 1000:.0f}мс"
+                for (name, key), histogram in sorted(self.histograms.items())
+                if name == "stage_seconds"
+            ]
+            gauges = [f"{name}={value}" for (name, key), value in sorted(self.gauges.items())]
+        return "; ".join(parts + stages + gauges)
+
+
+class MetricsReporter:
+    """Периодическая сводка в лог и необязательный HTTP-эндпоинт /metrics"""
+    def __init__(self, registry, interval=None, port=None, host=None):
+        self.registry = registry
+        self.interval = interval if interval is not None else float(os.getenv('METRICS_INTERVAL', '60'))
+        port = port if port is not None else os.getenv('METRICS_PORT')
+        self.port = int(port) if port else None
+        # По умолчанию эндпоинт доступен только локально; METRICS_HOST=0.0.0.0 открывает его наружу
+        self.host = host or os.getenv('METRICS_HOST', '127.0.0.1')
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.server = None
+
+    def start(self):
+        if self.interval > 0:
+            self.thread = threading.Thread(target=self.run, name="kb-metrics", daemon=True)
+            self.thread.start()
+        if self.port:
+            self.server = ThreadingHTTPServer((self.host, self.port), self.make_handler())
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, name="kb-metrics-http", daemon=True).start()
+            logging.info(f"Метрики доступны на http://{self.host}:{self.port}/metrics")
+        return self
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            logging.info(f"Метрики: {self.registry.summary()}")
+
+    def make_handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = registry.to_json(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        logging.info(f"Метрики: {self.registry.summary()}")
+
+
+class ArticleProfiler:
+    """Профилирование обработки статей через cProfile или pyinstrument (PROFILE=cprofile|pyinstrument).
+
+    Профиль собирается по каждому вызову отдельно и суммируется, поэтому работает
+    и при обработке статей в нескольких потоках.
+    """
+    def __init__(self, kind, path=None):
+        self.kind = kind
+        self.path = path or os.getenv('PROFILE_PATH') or (
+            "profile.pstats" if kind == "cprofile" else "profile.html"
+        )
+        self.lock = threading.Lock()
+        self.result = None
+
+    @contextmanager
+    def profile(self):
+        if self.kind == "cprofile":
+            import cProfile
+            import pstats
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                with self.lock:
+                    if self.result is None:
+                        self.result = pstats.Stats(profiler)
+                    else:
+                        self.result.add(profiler)
+        else:
+            from pyinstrument import Profiler
+            from pyinstrument.session import Session
+
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                session = profiler.stop()
+                with self.lock:
+                    self.result = session if self.result is None else Session.combine(self.result, session)
+
+    def save(self):
+        with self.lock:
+            if self.result is None:
+                return
+            if self.kind == "cprofile":
+                self.result.dump_stats(self.path)
+            else:
+                from pyinstrument.renderers import HTMLRenderer
+
+                with open(self.path, 'w', encoding='utf-8') as f:
+                    f.write(HTMLRenderer().render(self.result))
+        logging.info(f"Профиль обработки статей сохранен в {self.path}")
+
+
+def make_profiler():
+    """Профилировщик из переменной PROFILE или None"""
+    kind = os.getenv('PROFILE')
+    if kind in ("cprofile", "pyinstrument"):
+        return ArticleProfiler(kind)
+    if kind:
+        logging.warning(f"Неизвестный профилировщик PROFILE={kind}")
+    return None
+
+
+# Общий реестр метрик процесса
+metrics = Metrics()
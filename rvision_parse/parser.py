@@ -0,0 +1,505 @@
+import os
+import re
+import shutil
+import hashlib
+import logging
+import threading
+import requests
+from bs4 import Tag
+from pathlib import Path
+from requests.cookies import RequestsCookieJar
+from .http_client import HttpClient
+from .http_cache import HttpCache
+from .manifest import CrawlManifest, article_id
+from .atomic import atomic_write
+from .changeset import remove_file
+from .image_store import ImageStore
+from .html_backend import make_soup, default_backend, ARTICLE_NODES
+from .markdown_extract import extract_markdown
+from .image_pipeline import ImagePipeline
+from .metrics import metrics
+
+# Признак того, что страница не изменилась с прошлого обхода (304 или тот же дайджест)
+NOT_MODIFIED = object()
+
+# Метка изображения в извлеченном тексте; заменяется ссылкой после скачивания
+IMAGE_MARKER = "\x00IMG{}\x00"
+IMAGE_MARKER_RE = re.compile(r"( ?)\x00IMG(\d+)\x00")
+
+# Формат текста статьи; входит в хэш содержимого
+ARTICLE_FORMAT = "markdown-1"
+
+
+class ArticleRecord:
+    """Извлеченные данные статьи без дерева разбора; передаются между процессами"""
+    def __init__(self, url, navigation, title, content_text, content_hash, images,
+                 problem, solution, text, cache_entry=None):
+        self.url = url
+        self.navigation = navigation
+        self.title = title
+        self.content_text = content_text
+        self.content_hash = content_hash
+        self.images = images
+        # problem, solution и text содержат метки IMAGE_MARKER вместо изображений
+        self.problem = problem
+        self.solution = solution
+        self.text = text
+        self.cache_entry = cache_entry
+
+    def render(self, text, image_names):
+        """Подставляет ссылки на скачанные изображения вместо меток"""
+        def replace(match):
+            name = image_names[int(match.group(2))]
+            return f"{match.group(1)}${name}" if name else ""
+        return IMAGE_MARKER_RE.sub(replace, text)
+
+    def export(self, image_names):
+        """Запись статьи для структурированного экспорта"""
+        return {
+            'url': self.url,
+            'id': article_id(self.url),
+            'title': self.title,
+            'base': self.navigation['база'],
+            'section': self.navigation['раздел'],
+            'category': self.navigation['категория'],
+            'problem': self.render(self.problem, image_names),
+            'solution': self.render(self.solution, image_names),
+            'content': self.render(self.text, image_names),
+            'images': [name for name in image_names if name],
+        }
+
+
+class ArticlePage:
+    """Страница статьи, загруженная и разобранная один раз"""
+    def __init__(self, url, soup, cache_entry=None):
+        self.url = url
+        self.soup = soup
+        # Валидаторы ответа; попадают в HTTP-кэш только после успешной обработки
+        self.cache_entry = cache_entry
+
+        breadcrumbs = soup.find_all("li", class_="breadcrumbs__item")
+        self.navigation = {
+            'база': breadcrumbs[0].get_text(strip=True) if len(breadcrumbs) > 0 else "Без категории",
+            'раздел': breadcrumbs[1].get_text(strip=True) if len(breadcrumbs) > 1 else "Без раздела",
+            'категория': breadcrumbs[2].get_text(strip=True) if len(breadcrumbs) > 2 else "Без подраздела"
+        }
+
+        title_elem = soup.find("h1", class_="kb-article-title")
+        self.title = title_elem.get_text(strip=True) if title_elem else None
+
+        self.content_div = soup.find("div", class_="kb-article-content")
+        if isinstance(self.content_div, Tag):
+            # Markdown, плоский текст и изображения собираются за один обход блока
+            self.content = extract_markdown(self.content_div, IMAGE_MARKER)
+            self.content_text = self.content.plain_text
+            self.images = self.content.images
+        else:
+            self.content = None
+            self.content_text = None
+            self.images = []
+
+        # Хэш всего, что попадает в файл статьи, для сравнения с манифестом: берется Markdown,
+        # а не плоский текст, чтобы учитывались ссылки, оформление кода и структура списков;
+        # версия формата заставляет перезаписать статьи при смене формата файла
+        markdown = self.content.text if self.content is not None else ""
+        digest = hashlib.sha256(ARTICLE_FORMAT.encode('utf-8'))
+        for part in [self.title or "", *self.navigation.values(), markdown, *self.images]:
+            digest.update(part.encode('utf-8'))
+            digest.update(b"\0")
+        self.content_hash = digest.hexdigest()
+
+    def extract(self):
+        """Запись статьи с текстом в Markdown и метками вместо изображений"""
+        if not self.title or self.content is None:
+            return None
+
+        content = self.content
+        problem_text = content.problem if content.problem is not None else "Описание проблемы не найдено"
+        return ArticleRecord(
+            self.url, self.navigation, self.title, self.content_text, self.content_hash,
+            self.images, problem_text, "\n\n".join(content.solutions), content.text, self.cache_entry,
+        )
+
+
+def parse_article_html(html, url, backend=None, cache_entry=None):
+    """Разбирает HTML статьи в ArticleRecord; выполняется в том числе в пуле процессов"""
+    soup = make_soup(html, ARTICLE_NODES, backend)
+    return ArticlePage(url, soup, cache_entry).extract()
+
+
+class KnowledgeBaseParser:
+    def __init__(self, client=None, image_executor=None, html_backend=None, base_dir=None):
+        self.base_url = os.getenv('BASE_URL', 'https://r-vision.omnidesk.ru/knowledge_base/item/')
+        # Создаем правильный объект для cookies
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.cookies.set('PHPSESSID', os.getenv('PHPSESSID'))
+        self.base_dir = base_dir or os.getenv('OUTPUT_DIR', 'knowledge_base')
+        # Общая HTTP-сессия и пул для параллельной загрузки изображений
+        self.client = client or HttpClient(cookies=self.cookies)
+        self.image_executor = image_executor
+        # Экспортер структурированных записей (JSONL/Parquet), если включен
+        self.exporter = None
+        # Получатели записей сохраненных статей, например итератор crawl()
+        self.listeners = []
+        # HTML-парсер: lxml при наличии, иначе html.parser
+        self.html_backend = html_backend or default_backend()
+        # HTTP-кэш создается лениво внутри base_dir
+        self.use_http_cache = os.getenv('HTTP_CACHE', '1') == '1'
+        self.http_cache = None
+        self.http_cache_lock = threading.Lock()
+        # Хранилище изображений по SHA-256 и уже скачанные в этом процессе URL
+        self.image_store = None
+        self.image_store_lock = threading.Lock()
+        self.downloaded_images = {}
+        # Постобработка изображений в пуле процессов (IMAGE_OPTIMIZE, IMAGE_THUMBNAIL, IMAGE_DEDUP)
+        self.use_image_pipeline = ImagePipeline.enabled()
+        self.image_pipeline = None
+        self.image_pipeline_lock = threading.Lock()
+        # Журнал изменений дерева для выпуска changeset (CHANGESET_DIR)
+        self.track_changes = bool(os.getenv('CHANGESET_DIR'))
+        # Манифест обработанных статей, также создается лениво внутри base_dir
+        self.manifest = None
+        self.manifest_lock = threading.Lock()
+
+    def get_manifest(self):
+        """Возвращает манифест статей из base_dir"""
+        with self.manifest_lock:
+            if self.manifest is None:
+                self.manifest = CrawlManifest(os.path.join(self.base_dir, ".manifest.sqlite"))
+            return self.manifest
+
+    def close_manifest(self):
+        with self.manifest_lock:
+            if self.manifest is not None:
+                self.manifest.close()
+                self.manifest = None
+
+    def get_http_cache(self):
+        """Возвращает HTTP-кэш из base_dir, если он включен"""
+        if not self.use_http_cache:
+            return None
+        with self.http_cache_lock:
+            if self.http_cache is None:
+                self.http_cache = HttpCache(os.path.join(self.base_dir, ".http_cache.sqlite"))
+            return self.http_cache
+
+    def close_http_cache(self):
+        with self.http_cache_lock:
+            if self.http_cache is not None:
+                self.http_cache.close()
+                self.http_cache = None
+
+    def get_image_pipeline(self):
+        """Возвращает пул постобработки изображений, если она включена"""
+        if not self.use_image_pipeline:
+            return None
+        with self.image_pipeline_lock:
+            if self.image_pipeline is None:
+                self.image_pipeline = ImagePipeline(
+                    self.get_image_store(), os.path.join(self.base_dir, ".images.sqlite")
+                )
+            return self.image_pipeline
+
+    def close_image_pipeline(self):
+        with self.image_pipeline_lock:
+            if self.image_pipeline is not None:
+                self.image_pipeline.close()
+                self.image_pipeline = None
+
+    def close(self):
+        """Закрывает манифест, HTTP-кэш и пул постобработки изображений"""
+        self.close_image_pipeline()
+        self.close_http_cache()
+        self.close_manifest()
+
+    def request(self, url, **kwargs):
+        """Выполняет GET-запрос через общую HTTP-сессию"""
+        return self.client.get(url, **kwargs)
+
+    def get_soup(self, url):
+        """Получает BeautifulSoup объект для URL"""
+        try:
+            response = self.request(url)
+            if response.status_code == 200:
+                return make_soup(response.text, backend=self.html_backend)
+        except Exception as e:
+            logging.error(f"Ошибка при получении страницы {url}: {e}")
+        return None
+
+    def fetch_article(self, url, conditional=False):
+        """Загружает и разбирает статью одним запросом.
+
+        При conditional=True отправляет условный запрос и возвращает NOT_MODIFIED,
+        если страница не изменилась с прошлой успешной обработки.
+        """
+        page = self.fetch_article_html(url, conditional)
+        if page is None or page is NOT_MODIFIED:
+            return page
+        html, cache_entry = page
+        # Дерево строится только для крошек, заголовка и блока содержимого
+        with metrics.timer("parse"):
+            return ArticlePage(url, make_soup(html, ARTICLE_NODES, self.html_backend), cache_entry)
+
+    def fetch_article_html(self, url, conditional=False):
+        """Загружает HTML статьи без разбора: (html, запись кэша), NOT_MODIFIED или None.
+
+        Условный запрос отправляется, только если статья сохранена полностью (см.
+        is_article_complete); иначе страница загружается целиком и проходит проверку манифеста.
+        """
+        cache = self.get_http_cache()
+        if cache and conditional:
+            conditional = self.is_article_complete(url)
+        try:
+            with metrics.timer("fetch"):
+                headers = cache.conditional_headers(url) if cache and conditional else {}
+                response = self.request(url, headers=headers)
+                if cache and conditional and cache.is_unchanged(url, response):
+                    return NOT_MODIFIED
+                if response.status_code == 200:
+                    return response.text, cache.entry_for(response) if cache else None
+        except Exception as e:
+            logging.error(f"Ошибка при получении страницы {url}: {e}")
+        return None
+
+    def is_article_complete(self, url):
+        """Статья в манифесте сохранена полностью: файл на месте, все изображения загружены,
+        формат файла текущий"""
+        entry = self.get_manifest().get(url)
+        if entry is None or not entry['output_path'] or not os.path.exists(entry['output_path']):
+            return False
+        return (entry['article_format'] == ARTICLE_FORMAT
+                and entry['image_count'] == len(entry['image_hashes'])
+                and all(entry['image_hashes']))
+
+    def remember_article(self, article):
+        """Сохраняет валидаторы обработанной статьи в HTTP-кэш"""
+        cache = self.get_http_cache()
+        if cache and article.cache_entry:
+            cache.store(article.url, article.cache_entry)
+
+    def clean_directory(self):
+        """Очищает базовую директорию"""
+        self.close_http_cache()
+        self.close_manifest()
+        self.close_image_pipeline()
+        with self.image_store_lock:
+            self.image_store = None
+            self.downloaded_images = {}
+        if os.path.exists(self.base_dir):
+            shutil.rmtree(self.base_dir)
+        os.makedirs(self.base_dir)
+        os.makedirs(os.path.join(self.base_dir, "images"))
+
+    def get_image_store(self):
+        """Возвращает хранилище изображений в base_dir/images"""
+        with self.image_store_lock:
+            images_dir = os.path.join(self.base_dir, "images")
+            if self.image_store is None or self.image_store.directory != images_dir:
+                self.image_store = ImageStore(images_dir)
+            return self.image_store
+
+    def forget_images(self, urls=None):
+        """Забывает скачанные в этом процессе изображения (все или по URL), чтобы перепроверить их"""
+        with self.image_store_lock:
+            if urls is None:
+                self.downloaded_images = {}
+            else:
+                for url in urls:
+                    self.downloaded_images.pop(url, None)
+
+    def download_image(self, url, article_title=None):
+        """Скачивает изображение в общее хранилище и возвращает имя файла"""
+        return self.fetch_image(url)[0]
+
+    def fetch_image(self, url):
+        """Скачивает изображение и возвращает имя файла в хранилище и SHA-256 содержимого"""
+        with self.image_store_lock:
+            known = self.downloaded_images.get(url)
+        if known:
+            return known
+        try:
+            store = self.get_image_store()
+            cache = self.get_http_cache()
+            # Условный запрос имеет смысл, только если блоб из кэша уже лежит в хранилище
+            headers = {}
+            entry = cache.lookup(url) if cache else None
+            if entry and store.find(entry['digest']):
+                headers = cache.conditional_headers(url)
+            created = False
+            with self.request(url, headers=headers, stream=True) as response:
+                if headers and cache.not_modified(url, response):
+                    result = store.find(entry['digest']), entry['digest']
+                elif response.status_code == 200:
+                    name, digest, created = store.save_stream(response)
+                    if cache:
+                        cache.store(url, cache.entry_for(response, digest=digest,
+                                                         size=os.path.getsize(os.path.join(store.directory, name))))
+                    result = name, digest
+                else:
+                    logging.warning(f"Ошибка при скачивании изображения {url}: {response.status_code}")
+                    return None, None
+            pipeline = self.get_image_pipeline()
+            if pipeline:
+                # Пережимаются только блобы, созданные этим запросом
+                result = pipeline.process(*result, recompress=created), result[1]
+            if created and self.track_changes:
+                self.get_manifest().record_change("add", "image", f"images/{result[0]}", digest=result[1])
+            with self.image_store_lock:
+                self.downloaded_images[url] = result
+            return result
+        except Exception as e:
+            logging.warning(f"Ошибка при скачивании изображения {url}: {e}")
+        return None, None
+
+    def download_images(self, urls):
+        """Скачивает изображения статьи, параллельно при наличии пула.
+
+        Возвращает список пар (имя файла, SHA-256) в порядке URL.
+        """
+        executor = self.image_executor
+        if executor is None or len(urls) < 2:
+            return [self.fetch_image(url) for url in urls]
+        try:
+            futures = [executor.submit(self.fetch_image, url) for url in urls]
+        except RuntimeError:
+            # Пул закрыт завершившимся обходом, пока статья обновлялась вне его
+            return [self.fetch_image(url) for url in urls]
+        return [future.result() for future in futures]
+
+    def create_article_path(self, navigation):
+        """Создает путь для статьи на основе навигации"""
+        path_parts = [
+            self.base_dir,
+            self.sanitize_filename(navigation['база']),
+            self.sanitize_filename(navigation['раздел']),
+            self.sanitize_filename(navigation['категория'])
+        ]
+        current_path = Path(*path_parts)
+        os.makedirs(current_path, exist_ok=True)
+        return current_path
+
+    @staticmethod
+    def sanitize_filename(filename):
+        """Очищает строку для использования в качестве имени файла"""
+        invalid_chars = '<>:"/\\|?*'
+        for char in invalid_chars:
+            filename = filename.replace(char, '_')
+        return filename.strip()
+
+    def parse_page(self, url, article=None):
+        """Парсит страницу и сохраняет статью"""
+        if article is None:
+            article = self.fetch_article(url)
+            if article is None:
+                logging.error(f"Ошибка запроса: {url}")
+                return
+
+        if not article.title:
+            logging.error(f"Заголовок статьи не найден: {url}")
+            return
+        if not article.content_div:
+            logging.error(f"Содержание статьи не найдено: {url}")
+            return
+        with metrics.timer("extract"):
+            record = article.extract()
+        return self.save_record(record)
+
+    def save_record(self, record):
+        """Скачивает изображения статьи, сохраняет ее текст и записывает в манифест"""
+        navigation = record.navigation
+        manifest = self.get_manifest()
+        previous = manifest.get(record.url)
+
+        # Создаем путь для статьи
+        article_path = self.create_article_path(navigation)
+
+        image_names = []
+        image_hashes = []
+        with metrics.timer("image"):
+            downloaded = self.download_images(record.images)
+        for image_name, image_hash in downloaded:
+            image_names.append(image_name)
+            if image_name:
+                image_hashes.append(image_hash)
+
+        # Формируем метаданные и содержимое статьи
+        article_content = [
+            "# Метаданные",
+            f"# URL: {record.url}",
+            f"# Название: {record.title}",
+            f"# База: {navigation['база']}",
+            f"# Раздел: {navigation['раздел']}",
+            f"# Категория: {navigation['категория']}",
+            "",
+            "# Содержание",
+            record.render(record.text, image_names).strip()
+        ]
+
+        # Сохраняем статью
+        article_file = article_path / f"{self.sanitize_filename(record.title)}.txt"
+        with metrics.timer("write"):
+            atomic_write(article_file, '\n'.join(article_content), encoding='utf-8')
+
+            if self.exporter is not None:
+                self.exporter.write(record.export(image_names))
+            manifest.record(record.url, article_file, record.content_hash, image_hashes,
+                            ARTICLE_FORMAT, len(record.images))
+            # Манифест выдает абсолютные пути, article_file - относительно текущего каталога
+            old_path = previous['output_path'] if previous else None
+            # Заголовок или категория изменились: старый файл больше не соответствует статье,
+            # если только он не принадлежит и другой статье с тем же заголовком
+            released = old_path if old_path and old_path != os.path.abspath(article_file) \
+                and not manifest.path_in_use(old_path) else None
+            if released:
+                remove_file(self.base_dir, os.path.relpath(released, self.base_dir))
+            if self.track_changes:
+                self.record_article_change(record, article_file, previous, image_hashes, released)
+        if len(image_hashes) == len(record.images):
+            # С недокачанными изображениями валидаторы не сохраняются: иначе 304 при следующем
+            # обходе пропустит статью и изображения так и не будут загружены повторно
+            self.remember_article(record)
+        # Получатели узнают о статье, когда она уже записана в дерево и манифест
+        for listener in self.listeners:
+            listener(dict(record.export(image_names), path=str(article_file)))
+        return article_file
+
+    def record_article_change(self, record, article_file, previous, image_hashes, released=None):
+        """Записывает в журнал изменение статьи и изображения, на которые она больше не ссылается.
+
+        released - прежний файл статьи, удаленный из дерева.
+        """
+        manifest = self.get_manifest()
+        key = article_id(record.url)
+        old_path = previous['output_path'] if previous else None
+        if released:
+            manifest.record_change("delete", "article", os.path.relpath(released, self.base_dir), key)
+        op = "modify" if old_path == os.path.abspath(article_file) else "add"
+        manifest.record_change(op, "article", os.path.relpath(article_file, self.base_dir), key)
+        for digest in set(previous['image_hashes'] if previous else ()) - set(image_hashes):
+            manifest.record_change("release", "image", None, key, digest)
+
+    def get_article_title(self, url):
+        """Получает заголовок статьи"""
+        article = self.fetch_article(url)
+        return article.title if article else None
+
+    def get_article_content(self, url):
+        """Получает содержимое статьи"""
+        article = self.fetch_article(url)
+        return article.content_text if article else None
+
+    def get_image_count(self, url):
+        """Подсчитывает количество изображений в статье"""
+        article = self.fetch_article(url)
+        return len(article.images) if article else 0
+
+def main():
+    parser = KnowledgeBaseParser()
+    # Полная очистка только по явному запросу: HTTP-кэш и манифест позволяют обновлять дерево на месте
+    if os.getenv('CLEAN_OUTPUT') == '1':
+        parser.clean_directory()
+    
+    # URL для парсинга можно также вынести в .env
+    article_url = os.getenv('ARTICLE_URL', 'https://r-vision.omnidesk.ru/knowledge_base/item/339231?sid=72288')
+    parser.parse_page(article_url)
+
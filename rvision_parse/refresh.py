@@ -0,0 +1,326 @@
+"""Долгоживущий режим срочных обновлений статей поверх фонового полного обхода.
+
+Запросы - строки вида "ID|URL [приоритет]" - приходят из stdin, из дописываемого
+файла (как tail -F) или через локальный сокет (путь Unix-сокета или порт на
+127.0.0.1). Статья стоит в очереди один раз; первой обрабатывается самая
+приоритетная, при равенстве - поступившая раньше. Пока идут срочные обновления,
+фоновый обход не берет новые статьи.
+
+    rvision-parse refresh --socket /run/kb-refresh.sock --crawl-interval 21600
+    echo 339231 | socat - UNIX-CONNECT:/run/kb-refresh.sock
+
+Статьи перечитываются в существующее дерево и манифест. Вне полного обхода
+обновления копятся в отдельном обходе, который завершается (и выпускает
+changeset при CHANGESET_DIR), как только очередь пустеет; во время полного
+обхода они записываются в него.
+"""
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+import socketserver
+from contextlib import ExitStack
+
+from .manifest import article_id
+from .discovery import article_url
+from .metrics import metrics
+
+# Сколько ждать, прежде чем повторить статью, которую сейчас обрабатывает обход
+BUSY_RETRY_DELAY = 1.0
+
+
+class RefreshQueue:
+    """Очередь с приоритетом без повторов: статья, уже ждущая обработки, не дублируется"""
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.heap = []
+        self.pending = {}  # ID статьи -> (приоритет, номер) актуальной записи в куче
+        self.counter = itertools.count()
+        self.closed = False
+
+    def put(self, url, priority=0, queued_at=None):
+        """Ставит статью в очередь; повторный запрос может только повысить приоритет"""
+        key = article_id(url)
+        with self.condition:
+            if self.closed:
+                return False
+            current = self.pending.get(key)
+            if current is not None and current[0] >= priority:
+                return False
+            number = next(self.counter)
+            self.pending[key] = (priority, number)
+            # Прежняя запись статьи остается в куче и пропускается при выдаче
+            heapq.heappush(self.heap, (-priority, number, key, url, queued_at or time.monotonic()))
+            metrics.set_gauge("refresh_queue_depth", len(self.pending))
+            self.condition.notify()
+            return True
+
+    def get(self, timeout=None):
+        """Следующая статья (url, приоритет, время постановки) или None по таймауту и после close()"""
+        with self.condition:
+            deadline = time.monotonic() + timeout if timeout is not None else None
+            while True:
+                while self.heap:
+                    priority, number, key, url, queued_at = heapq.heappop(self.heap)
+                    if self.pending.get(key) != (-priority, number):
+                        continue
+                    del self.pending[key]
+                    metrics.set_gauge("refresh_queue_depth", len(self.pending))
+                    return url, -priority, queued_at
+                if self.closed:
+                    return None
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+    def close(self):
+        """Больше не принимает запросы; оставшиеся еще будут выданы"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __len__(self):
+        with self.condition:
+            return len(self.pending)
+
+
+def parse_request(line):
+    """Разбирает строку запроса в (ID или URL, приоритет); пустые строки и # - None"""
+    parts = line.split()
+    if not parts or parts[0].startswith("#"):
+        return None
+    try:
+        priority = int(parts[1]) if len(parts) > 1 else 0
+    except ValueError:
+        raise ValueError(f"приоритет должен быть целым числом: {parts[1]}")
+    return parts[0], priority
+
+
+class RefreshHandler(socketserver.StreamRequestHandler):
+    """Построчный протокол сокета: на каждую строку запроса отвечает queued URL или error"""
+    def handle(self):
+        for line in self.rfile:
+            try:
+                url = self.server.service.submit_line(line.decode('utf-8', 'replace'))
+            except ValueError as e:
+                reply = f"error {e}"
+            else:
+                reply = f"queued {url}" if url else "skipped"
+            self.wfile.write(f"{reply}\n".encode('utf-8'))
+
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class RefreshService:
+    """Обрабатывает очередь срочных обновлений и, при crawl_interval > 0, периодический полный обход"""
+    def __init__(self, collector, workers=None, crawl_interval=None, idle=1.0):
+        self.collector = collector
+        self.queue = RefreshQueue()
+        self.workers = workers or int(os.getenv('REFRESH_WORKERS', '2'))
+        # Пауза между полными обходами в секундах; 0 - только срочные обновления
+        self.crawl_interval = crawl_interval if crawl_interval is not None \
+            else float(os.getenv('CRAWL_INTERVAL', '0'))
+        # Через сколько секунд простоя очереди завершается обход из обновлений
+        self.idle = idle
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.crawling = False
+        self.active = 0
+        # Обновления записаны в обход, который должен завершить сервис, а не полный обход
+        self.dirty = False
+        # Прерванный полный обход остается незавершенным до его продолжения
+        self.interrupted_run = collector.parser.get_manifest().open_run()
+        # Конец stdin завершает работу, только если других источников нет
+        self.long_running = False
+        self.worker_threads = []
+        self.threads = []
+        self.servers = []
+        self.resources = ExitStack()
+
+    def submit(self, value, priority=0):
+        """Ставит статью (ID или URL) в очередь и возвращает ее URL"""
+        url = article_url(self.collector.base_url, value)
+        if self.queue.put(url, priority):
+            logging.info(f"Срочное обновление {url} (приоритет {priority}), в очереди {len(self.queue)}")
+        return url
+
+    def submit_line(self, line):
+        request = parse_request(line)
+        if request is None:
+            return None
+        return self.submit(*request)
+
+    def start(self, stdin=None, watch=None, socket=None):
+        """Запускает обработчики очереди, полный обход и источники запросов"""
+        self.long_running = bool(watch or socket or self.crawl_interval > 0)
+        # Экспорт, метрики и пул изображений открыты все время работы, а не на один обход
+        self.resources.enter_context(self.collector.collecting())
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.work, name=f"kb-refresh-{i}", daemon=True)
+            thread.start()
+            self.worker_threads.append(thread)
+        if self.crawl_interval > 0:
+            self.spawn(self.crawl_loop, "kb-refresh-crawl")
+        if watch:
+            self.spawn(self.watch_file, "kb-refresh-watch", watch)
+        if socket:
+            self.serve_socket(socket)
+        if stdin is not None:
+            self.spawn(self.read_stream, "kb-refresh-stdin", stdin)
+        return self
+
+    def spawn(self, target, name, *args):
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def work(self):
+        while True:
+            item = self.queue.get(timeout=self.idle)
+            if item is None:
+                if self.queue.closed:
+                    return
+                self.finish_idle_run()
+                continue
+            url, priority, queued_at = item
+            with self.lock:
+                self.active += 1
+            try:
+                with self.collector.urgent_work():
+                    result = self.collector.process_article(url, refresh=True)
+            finally:
+                with self.lock:
+                    self.active -= 1
+                    if not self.crawling:
+                        self.dirty = True
+            if result is None:
+                if not self.stop_event.is_set():
+                    # Статью сейчас обрабатывает обход и мог прочитать ее до правки: повторяем позже
+                    time.sleep(BUSY_RETRY_DELAY)
+                    self.queue.put(url, priority, queued_at)
+                continue
+            metrics.inc("refresh_total", result=result)
+            metrics.observe("refresh_seconds", time.monotonic() - queued_at)
+            logging.info(f"Статья {url} обновлена по запросу ({result}) за "
+                         f"{time.monotonic() - queued_at:.1f} с")
+
+    def finish_idle_run(self):
+        """Завершает обход из обновлений, когда очередь пуста, а полный обход не идет"""
+        with self.lock:
+            if self.crawling or self.active or not self.dirty or len(self.queue):
+                return
+            self.dirty = False
+            manifest = self.collector.parser.get_manifest()
+            if manifest.open_run() in (None, self.interrupted_run):
+                return
+            self.collector.finish_updates()
+
+    def crawl_loop(self):
+        while not self.stop_event.is_set():
+            with self.lock:
+                # Полный обход продолжит открытый обход и сам выпустит его changeset
+                self.crawling = True
+                self.dirty = False
+            try:
+                self.collector.collect_all_articles()
+            except Exception as e:
+                logging.error(f"Ошибка полного обхода: {e}")
+            finally:
+                with self.lock:
+                    self.crawling = False
+                    if not self.stop_event.is_set():
+                        self.interrupted_run = None
+                        # Обновления, пришедшие после завершения обхода, попали в новый обход
+                        self.dirty = self.collector.parser.get_manifest().open_run() is not None
+            if self.stop_event.wait(self.crawl_interval):
+                return
+
+    def read_stream(self, stream):
+        """Читает запросы построчно, например из stdin"""
+        for line in stream:
+            try:
+                self.submit_line(line)
+            except ValueError as e:
+                logging.warning(f"Неверный запрос {line.strip()!r}: {e}")
+        if not self.long_running:
+            self.queue.close()
+
+    def watch_file(self, path, interval=1.0):
+        """Следит за дозаписью в файл, как tail -F: каждая новая строка - запрос"""
+        position, inode = 0, None
+        if os.path.exists(path):
+            stat = os.stat(path)
+            position, inode = stat.st_size, stat.st_ino
+        while not self.stop_event.wait(interval):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                position, inode = 0, None
+                continue
+            # Файл заменен или усечен - читаем его с начала
+            if stat.st_ino != inode or stat.st_size < position:
+                position, inode = 0, stat.st_ino
+            if stat.st_size == position:
+                continue
+            with open(path, 'rb') as f:
+                f.seek(position)
+                data = f.read()
+            # Незаконченная строка дочитывается при следующей проверке
+            end = data.rfind(b"\n") + 1
+            position += end
+            for line in data[:end].decode('utf-8', 'replace').splitlines():
+                try:
+                    self.submit_line(line)
+                except ValueError as e:
+                    logging.warning(f"Неверный запрос {line.strip()!r}: {e}")
+
+    def serve_socket(self, address):
+        """Локальный сокет: путь Unix-сокета или номер порта на 127.0.0.1"""
+        if "/" in address:
+            if os.path.exists(address):
+                os.unlink(address)
+            server = ThreadingUnixServer(address, RefreshHandler)
+        else:
+            server = ThreadingTCPServer(("127.0.0.1", int(address)), RefreshHandler)
+        server.service = self
+        self.servers.append(server)
+        threading.Thread(target=server.serve_forever, name="kb-refresh-socket", daemon=True).start()
+        logging.info(f"Запросы на обновление принимаются на {address}")
+
+    def wait(self):
+        """Ждет, пока обработчики очереди не закончат работу (конец stdin без других
+        источников или stop())"""
+        for thread in self.worker_threads:
+            # join с таймаутом, чтобы Ctrl+C прерывал ожидание
+            while thread.is_alive():
+                thread.join(0.5)
+
+    def stop(self):
+        """Останавливает прием запросов и полный обход; прерванный обход продолжится позже"""
+        self.stop_event.set()
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+            if isinstance(server, ThreadingUnixServer):
+                os.unlink(server.server_address)
+        self.servers = []
+        dropped = len(self.queue)
+        if dropped:
+            logging.warning(f"Не обработано запросов на обновление: {dropped}")
+        self.queue.close()
+        self.collector.stop()
+        # stdin может так и не закрыться, его поток не ждем
+        for thread in self.worker_threads + [t for t in self.threads if t.name != "kb-refresh-stdin"]:
+            thread.join()
+        self.finish_idle_run()
+        self.resources.close()
@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .metrics import metrics
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов по алгоритму token bucket"""
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Блокирует поток до появления свободного токена"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """Отдельный token bucket для каждого хоста"""
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        """Ждет разрешения на запрос к хосту из URL"""
+        if not self.rate:
+            return
+        host = urlsplit(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self.buckets[host] = bucket
+        bucket.acquire()
+
+
+class AdaptiveLimit:
+    """AIMD-регулятор числа одновременных запросов к одному хосту.
+
+    Раз в окно из window успешных ответов смотрит на p95 задержки: если он не
+    вырос относительно базового уровня и лимит был выбран полностью, лимит растет
+    на единицу, а при росте p95 уменьшается на четверть. На 429/503 и сетевые
+    ошибки лимит сразу уменьшается вдвое - но не чаще одного раза на запросы,
+    отправленные до предыдущего уменьшения.
+    """
+    OVERLOAD_STATUSES = {429, 503}
+
+    def __init__(self, host, initial, max_limit, min_limit=1, window=20,
+                 latency_tolerance=2.0, latency_slack=0.05):
+        self.host = host
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = float(min(max(initial, min_limit), self.max_limit))
+        self.window = window
+        self.latency_tolerance = latency_tolerance
+        self.latency_slack = latency_slack
+        self.inflight = 0
+        self.latencies = []
+        self.saturated = False
+        self.baseline = None  # лучший p95 за последнее время
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+        metrics.set_gauge("concurrency_limit", int(self.limit), host=host)
+
+    def acquire(self):
+        """Блокирует поток, пока к хосту уже идет limit запросов"""
+        with self.condition:
+            while self.inflight >= int(self.limit):
+                self.saturated = True
+                self.condition.wait()
+            self.inflight += 1
+            if self.inflight >= int(self.limit):
+                self.saturated = True
+
+    def release(self, elapsed, status):
+        """Учитывает завершенный запрос; status=None - сетевая ошибка или таймаут"""
+        with self.condition:
+            self.inflight -= 1
+            if status is None or status in self.OVERLOAD_STATUSES:
+                # Ошибки запросов, ушедших еще при старом лимите, уже учтены
+                if time.monotonic() - elapsed >= self.last_decrease:
+                    self.decrease(0.5, f"ответ {status or 'без ответа'}")
+            else:
+                self.latencies.append(elapsed)
+                if len(self.latencies) >= self.window:
+                    self.evaluate()
+            self.condition.notify_all()
+
+    def evaluate(self):
+        """Решение по итогам окна: увеличить, уменьшить или оставить лимит"""
+        self.latencies.sort()
+        p95 = self.latencies[int(0.95 * (len(self.latencies) - 1))]
+        if self.baseline is not None and p95 > self.baseline * self.latency_tolerance \
+                and p95 - self.baseline > self.latency_slack:
+            self.decrease(0.75, f"p95 {p95 * 1000:.0f}мс при базовом {self.baseline * 1000:.0f}мс")
+        elif self.saturated and self.limit < self.max_limit:
+            self.change(self.limit + 1, f"p95 {p95 * 1000:.0f}мс")
+        # Базовый уровень медленно подтягивается вверх, если сервер стал стабильно медленнее
+        self.baseline = p95 if self.baseline is None else min(p95, self.baseline * 1.05)
+        self.latencies = []
+        self.saturated = False
+
+    def decrease(self, factor, reason):
+        self.last_decrease = time.monotonic()
+        self.change(max(self.min_limit, self.limit * factor), reason)
+        self.latencies = []
+        self.saturated = False
+
+    def change(self, limit, reason):
+        old = int(self.limit)
+        self.limit = limit
+        if int(limit) != old:
+            logging.info(f"Параллелизм для {self.host}: {old} -> {int(limit)} ({reason})")
+            metrics.set_gauge("concurrency_limit", int(limit), host=self.host)
+
+
+class HostConcurrencyLimiter:
+    """Отдельный адаптивный лимит одновременных запросов для каждого хоста"""
+    def __init__(self, initial, max_limit, **options):
+        self.initial = initial
+        self.max_limit = max_limit
+        self.options = options
+        self.limits = {}
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            limit = self.limits.get(host)
+            if limit is None:
+                limit = AdaptiveLimit(host, self.initial, self.max_limit, **self.options)
+                self.limits[host] = limit
+        return limit
+
+    def acquire(self, url):
+        """Ждет свободного слота для хоста и возвращает его регулятор для release"""
+        limit = self.get(url)
+        limit.acquire()
+        return limit